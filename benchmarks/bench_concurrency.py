@@ -0,0 +1,77 @@
+"""Навантажувальний тест паралельної обробки оновлень.
+
+Проганяє через справжні обробники бота (main.build_application) сценарій
+«відмітка приходу → місячний звіт → відмітка відходу» для багатьох
+користувачів одночасно при різних лімітах паралельності. Bot API
+імітується FakeBotAPI із затримкою --api-latency, кожен рівень працює в
+окремому процесі з чистою базою. Для перевірки порядку відповіді кожного
+користувача порівнюються з першим (послідовним) прогоном.
+
+Приклад:
+    python benchmarks/bench_concurrency.py --users 300 --levels 1 4 16 64
+"""
+import argparse
+import asyncio
+import re
+import time
+
+from fakebot import FakeBotAPI, message_update, run_isolated
+
+FIRST_USER_ID = 100000
+# Кроки сценарію для кожного користувача (кнопки української клавіатури)
+SCRIPT = ['/start', '⏱ Записати час', '🟢 Прихід', '↩️ Назад', '📊 Звіт', '📈 Місяць',
+          '↩️ Назад', '⏱ Записати час', '🔴 Відхід', '↩️ Назад']
+
+
+async def run_level(level, users, latency):
+    import main
+    from outbox import PriorityRateLimiter
+    api = FakeBotAPI(latency)
+    # Ліміти Telegram тут не перевіряються — знімаємо їх, щоб міряти саму обробку
+    limiter = PriorityRateLimiter(global_rate=1e9, private_chat_rate=1e9, private_chat_burst=1e9)
+    application = main.build_application(request=api, rate_limiter=limiter, concurrent_updates=level)
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    user_ids = range(FIRST_USER_ID, FIRST_USER_ID + users)
+    started = time.perf_counter()
+    # Кожен користувач натискає кнопки сценарію поспіль, не чекаючи відповіді
+    for user_id in user_ids:
+        for text in SCRIPT:
+            application.update_queue.put_nowait(message_update(application.bot, user_id, text))
+    await application.update_queue.join()
+    elapsed = time.perf_counter() - started
+
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+    # Час у відповідях різниться між прогонами, тому цифри не порівнюємо
+    replies = {user_id: [re.sub(r'\d', '#', text or '') for text in api.replies(user_id)] for user_id in user_ids}
+    return {'updates': len(SCRIPT) * users, 'elapsed': elapsed, 'replies': replies}
+
+
+def run_in_process(level, users, latency):
+    return asyncio.run(run_level(level, users, latency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--api-latency', type=float, default=0.02, help='затримка відповіді Bot API, с')
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'ліміт':>6} {'оновлень/с':>11} {'прискорення':>12} {'порушень порядку':>17}")
+    for level in args.levels:
+        result = run_isolated(run_in_process, level, args.users, args.api_latency)
+        throughput = result['updates'] / result['elapsed']
+        if baseline is None:
+            baseline = (throughput, result['replies'])
+        mismatches = sum(1 for user_id, replies in result['replies'].items() if replies != baseline[1][user_id])
+        print(f"{level:>6} {throughput:>11.0f} {throughput / baseline[0]:>11.1f}x {mismatches:>17}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""Навантажувальні сценарії через справжні обробники бота.
+
+Кожен сценарій запускається в окремому процесі з чистою базою, заповненою
+історією змін (--users користувачів по --history-days днів). Далі
+main.build_application працює проти FakeBotAPI, а кожен користувач
+проходить свій сценарій як живий: наступне натискання лише після
+обробки попереднього. Усі користувачі стартують одночасно.
+
+Сценарії:
+    clock_in_storm     — усі одночасно відмічають прихід;
+    report_storm       — усі одночасно відкривають місячний звіт (кінець місяця);
+    history_browsing   — перегляд минулого місяця й окремого дня в історії;
+    admin_export       — адміністратор кілька разів поспіль вивантажує /exportusers.
+
+Для кожного сценарію виводяться пропускна здатність, p50/p95/p99 затримки
+обробки, кількість SQL-інструкцій і викликів Bot API на оновлення; --json
+зберігає ті самі дані у файл для відстеження регресій ('-' — у stdout).
+З --sql-trace кожен сценарій працює з профайлером SQL (sqltrace): у JSON
+додаються найдорожчі операції сховища за обробниками, а повільні
+інструкції з планами пишуться в журнал TIMEKEEPER_SLOW_QUERY_LOG.
+
+Приклад:
+    python benchmarks/bench_scenarios.py --users 500 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+from fakebot import FakeBotAPI, callback_update, message_update, percentile, run_isolated
+
+FIRST_USER_ID = 100000
+ADMIN_ID = 667685166
+
+
+def seed(users: int, history_days: int) -> dict:
+    """Заповнює базу бота історією змін і повертає дати, за якими ходять сценарії"""
+    import pytz
+    from storage import DB_PATH, DEFAULT_TIMEZONE, migrate
+
+    today = datetime.now(pytz.timezone(DEFAULT_TIMEZONE)).date()
+    dates = [(today - timedelta(days=days_ago)).isoformat() for days_ago in range(history_days, 0, -1)]
+    conn = sqlite3.connect(DB_PATH)
+    # Записи вставляються в базову схему, а наступні міграції рахують worked_seconds і monthly_totals
+    migrate(conn, 1)
+    conn.executemany('''INSERT INTO time_records (date, user_id, arrival_time, departure_time)
+                        VALUES (?, ?, '08:00:00', '16:30:00')''',
+                     ((date, user_id) for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users) for date in dates))
+    conn.commit()
+    migrate(conn)
+    # Половина користувачів уже в локальному кеші профілів, решту експорт запитає в API
+    conn.executemany('''INSERT INTO user_profiles (user_id, first_name, is_bot, language_code, fetched_at)
+                        VALUES (?, ?, 0, 'uk', ?)''',
+                     ((user_id, f'User{user_id}', int(time.time()))
+                      for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users, 2)))
+    conn.commit()
+    conn.close()
+    return {'month': dates[0][:7], 'day': dates[0]}
+
+
+def tap(data: str) -> tuple:
+    """Крок сценарію — натискання інлайн-кнопки з callback_data data"""
+    return ('callback', data)
+
+
+def clock_in_storm(history):
+    return ['/start', '⏱ Записати час'], ['🟢 Прихід']
+
+
+def report_storm(history):
+    return ['/start', '📊 Звіт'], ['📈 Місяць']
+
+
+def history_browsing(history):
+    # Місяць, день, повернення до звіту (з кешу) і до списку місяців — кнопками одного повідомлення
+    return ['/start', '⚙️ Налаштування'], ['📊 Історія', tap(f"m={history['month']}"), tap(f"t={history['day']}"),
+                                           tap(f"m={history['month']}"), tap('m<')]
+
+
+def admin_export(history):
+    return [], ['/exportusers'] * 5
+
+
+# Сценарій -> (функція, чи виконують його всі користувачі, а не лише адміністратор)
+SCENARIOS = {
+    'clock_in_storm': (clock_in_storm, True),
+    'report_storm': (report_storm, True),
+    'history_browsing': (history_browsing, True),
+    'admin_export': (admin_export, False),
+}
+
+
+async def run_scenario(name, users, history_days, latency, concurrency):
+    import main
+    from outbox import PriorityRateLimiter
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    if main.query_profiler:
+        # Журнал профайлера пишеться через logging: вмикаємо його назад, приглушивши решту логерів
+        logging.disable(logging.NOTSET)
+        logging.getLogger().setLevel(logging.ERROR)
+    history = seed(users, history_days)
+    script, everyone = SCENARIOS[name]
+    warmup, steps = script(history)
+    user_ids = range(FIRST_USER_ID, FIRST_USER_ID + users) if everyone else [ADMIN_ID]
+
+    api = FakeBotAPI(latency)
+    limiter = PriorityRateLimiter(global_rate=1e9, private_chat_rate=1e9, private_chat_burst=1e9)
+    application = main.build_application(request=api, rate_limiter=limiter, concurrent_updates=concurrency)
+    handled = {}
+    errors = []
+
+    async def mark_handled(update: Update, context):
+        handled.pop(update.update_id).set_result(time.perf_counter())
+
+    async def count_error(update, context):
+        errors.append(context.error)
+
+    # Остання група: спрацьовує після всіх обробників оновлення, зокрема й тих, що впали
+    application.add_handler(TypeHandler(Update, mark_handled), group=99)
+    application.add_error_handler(count_error)
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    loop = asyncio.get_running_loop()
+
+    async def send(user_id, step):
+        if isinstance(step, tuple):
+            update = callback_update(application.bot, user_id, step[1])
+        else:
+            update = message_update(application.bot, user_id, step)
+        handled[update.update_id] = loop.create_future()
+        sent_at = time.perf_counter()
+        application.update_queue.put_nowait(update)
+        return await handled[update.update_id] - sent_at
+
+    async def act(user_id, steps, latencies):
+        for step in steps:
+            latencies.append(await send(user_id, step))
+
+    await asyncio.gather(*(act(user_id, warmup, []) for user_id in user_ids))
+    await main.persistence.flush()
+    statements, api_calls, errors_before = main.db.statements, len(api.sent), len(errors)
+    if main.query_profiler:
+        main.query_profiler.reset()
+
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(act(user_id, steps, latencies) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+    # Запис сесій — частина ціни оновлень, тож рахуємо його до зупинки
+    await main.persistence.flush()
+    statements = main.db.statements - statements
+    api_calls = len(api.sent) - api_calls
+
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+    latencies.sort()
+    result = {
+        'users': len(user_ids),
+        'updates': len(latencies),
+        'elapsed_s': round(elapsed, 4),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1e3, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1e3, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1e3, 2),
+        'max_ms': round(latencies[-1] * 1e3, 2),
+        'db_statements': statements,
+        'db_statements_per_update': round(statements / len(latencies), 2),
+        'api_calls': api_calls,
+        'errors': len(errors) - errors_before,
+    }
+    if main.query_profiler:
+        result['slow_statements'] = main.query_profiler.slow_statements
+        result['sql_operations'] = [{key: round(value, 3) if isinstance(value, float) else value
+                                     for key, value in operation.items()}
+                                    for operation in main.query_profiler.snapshot()[:10]]
+    return result
+
+
+def run_in_process(*args):
+    return asyncio.run(run_scenario(*args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--history-days', type=int, default=90)
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--api-latency', type=float, default=0.02, help='затримка відповіді Bot API, с')
+    parser.add_argument('--concurrency', type=int, default=32, help='ліміт паралельних оновлень')
+    parser.add_argument('--json', help="файл для результатів у JSON; '-' — stdout")
+    parser.add_argument('--sql-trace', action='store_true', help='профілювати SQL-операції сховища')
+    args = parser.parse_args()
+    if args.sql_trace:
+        # Процеси сценаріїв успадковують середовище; журнал лишається в поточній теці
+        os.environ['TIMEKEEPER_SQL_TRACE'] = 'slow'
+        os.environ.setdefault('TIMEKEEPER_SLOW_QUERY_LOG', os.path.abspath('slow_queries.log'))
+
+    results = {
+        'parameters': {'users': args.users, 'history_days': args.history_days,
+                       'api_latency_s': args.api_latency, 'concurrency': args.concurrency},
+        'scenarios': {},
+    }
+    table = sys.stderr if args.json == '-' else sys.stdout
+    print(f"{'сценарій':>17} {'оновлень/с':>11} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} "
+          f"{'SQL/оновл.':>11} {'помилок':>8}", file=table)
+    for name in args.scenarios:
+        result = run_isolated(run_in_process, name, args.users, args.history_days, args.api_latency, args.concurrency)
+        results['scenarios'][name] = result
+        print(f"{name:>17} {result['throughput']:>11.0f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+              f"{result['p99_ms']:>9.1f} {result['db_statements_per_update']:>11.1f} {result['errors']:>8}",
+              file=table, flush=True)
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Бенчмарк запитів до time_records на різних обсягах даних.
+
+Створює тимчасові бази з синтетичними записами, застосовує міграції схеми
+і вимірює середній час типових запитів бота. З прапорцем --legacy ті самі
+запити виконуються також на старій схемі без індексу для порівняння.
+
+Приклад:
+    python benchmarks/bench_schema.py --sizes 10000 100000 1000000 10000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from storage import MIGRATIONS, Storage, migrate  # noqa: E402
+
+DAYS_PER_USER = 365
+START_DATE = date(2024, 1, 1)
+
+
+def fill(conn, rows: int, legacy: bool) -> int:
+    """Заповнює time_records синтетичними змінами 08:00-16:30 UTC; повертає кількість користувачів"""
+    users = max(1, rows // DAYS_PER_USER)
+    days = [START_DATE + timedelta(days=day) for day in range(DAYS_PER_USER)]
+    if legacy:
+        shifts = [(day.isoformat(), '08:00:00', '16:30:00') for day in days]
+        insert = '''INSERT INTO time_records (date, user_id, arrival_time, departure_time)
+                    VALUES (?, ?, ?, ?)'''
+    else:
+        starts = [int(datetime(day.year, day.month, day.day, 8, tzinfo=timezone.utc).timestamp()) for day in days]
+        shifts = [(day.isoformat(), start_at, start_at + 30600, 'UTC') for day, start_at in zip(days, starts)]
+        insert = '''INSERT INTO time_records (date, user_id, start_at, end_at, timezone)
+                    VALUES (?, ?, ?, ?, ?)'''
+
+    def generate():
+        produced = 0
+        for user_id in range(1, users + 1):
+            for day, *times in shifts:
+                if produced == rows:
+                    return
+                yield day, user_id, *times
+                produced += 1
+
+    conn.executemany(insert, generate())
+    conn.commit()
+    return users
+
+
+def legacy_queries(conn, user_id, month, day):
+    conn.execute('SELECT arrival_time, departure_time FROM time_records WHERE date = ? AND user_id = ?',
+                 (day, user_id)).fetchone()
+    conn.execute('''SELECT date, arrival_time, departure_time FROM time_records
+                    WHERE date LIKE ? AND user_id = ? ORDER BY date''', (f"{month}%", user_id)).fetchall()
+    conn.execute('''SELECT DISTINCT date FROM time_records
+                    WHERE date LIKE ? AND user_id = ? ORDER BY date DESC''', (f"{month}%", user_id)).fetchall()
+
+
+def current_queries(conn, user_id, month, day):
+    Storage._get_shifts(conn, user_id, day)
+    Storage._get_month_day_totals(conn, user_id, month)
+    Storage._get_date_page(conn, user_id, month, None, True, 9)
+    Storage._get_open_shift(conn, user_id, 0)
+
+
+def measure(conn, users, queries, iterations):
+    rng = random.Random(42)
+    samples = []
+    for _ in range(iterations):
+        user_id = rng.randint(1, users)
+        day = START_DATE + timedelta(days=rng.randrange(DAYS_PER_USER))
+        started = time.perf_counter()
+        queries(conn, user_id, day.strftime('%Y-%m'), day.isoformat())
+        samples.append(time.perf_counter() - started)
+    return sum(samples) / len(samples) * 1e6
+
+
+def run(rows, iterations, legacy):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        schemas = [('current', len(MIGRATIONS), current_queries)]
+        if legacy:
+            schemas.append(('legacy', 1, legacy_queries))
+        for name, version, queries in schemas:
+            conn = sqlite3.connect(os.path.join(tmp, f'{name}.db'))
+            # Стара схема — лише базова міграція без ключа та індексу
+            migrate(conn, target=version)
+            users = fill(conn, rows, legacy=name == 'legacy')
+            results[name] = measure(conn, users, queries, iterations)
+            conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--legacy', action='store_true', help='порівняти зі схемою без індексу')
+    args = parser.parse_args()
+    print(f"{'рядків':>10} {'поточна, мкс':>14}" + (f" {'без індексу, мкс':>18}" if args.legacy else ''))
+    for rows in args.sizes:
+        results = run(rows, args.iterations, args.legacy)
+        line = f"{rows:>10} {results['current']:>14.1f}"
+        if args.legacy:
+            line += f" {results['legacy']:>18.1f}"
+        print(line, flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Бенчмарк профілів SQLite під одночасним навантаженням звітів і відміток.
+
+Створює тимчасову базу з історією змін і для кожного профілю з
+storage.STORAGE_PROFILES запускає через Storage паралельних клієнтів:
+одні відмічають прихід і відхід (записи), інші будують місячні звіти
+(читання). Виводить пропускну здатність, затримки читання і кількість
+помилок «database is locked».
+
+Приклад:
+    python benchmarks/bench_storage_profiles.py --duration 10 --writers 8 --readers 16
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from reports import month_totals  # noqa: E402
+from storage import STORAGE_PROFILES, Storage, _fill_monthly_totals, migrate  # noqa: E402
+
+DAYS_PER_USER = 365
+START_DATE = date(2024, 1, 1)
+# Відмітки бенчмарку пишуться окремим користувачам, щоб не конфліктувати з історією
+CLOCK_IN_USER_BASE = 10_000_000
+
+
+def build_database(path, users):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    days = [START_DATE + timedelta(days=day) for day in range(DAYS_PER_USER)]
+    # Зміни 08:00-16:30 UTC
+    shifts = [(day.isoformat(), int(datetime(day.year, day.month, day.day, 8, tzinfo=timezone.utc).timestamp()))
+              for day in days]
+    conn.executemany('''INSERT INTO time_records (date, user_id, start_at, end_at, timezone)
+                        VALUES (?, ?, ?, ?, 'UTC')''',
+                     ((day, user_id, start_at, start_at + 30600)
+                      for user_id in range(1, users + 1) for day, start_at in shifts))
+    _fill_monthly_totals(conn)
+    conn.commit()
+    conn.close()
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_profile(path, profile, users, writers, readers, duration):
+    db = Storage(path, readers=4, profile=profile, checkpoint_interval=0)
+    await db.setup()
+    deadline = time.perf_counter() + duration
+    clock_in_users = itertools.count(CLOCK_IN_USER_BASE)
+    stats = {'writes': 0, 'reads': 0, 'locked': 0, 'read_latency': [], 'write_latency': []}
+
+    async def clock_in():
+        while time.perf_counter() < deadline:
+            user_id = next(clock_in_users)
+            started = time.perf_counter()
+            try:
+                shift_id = await db.insert_arrival(user_id, '2025-01-15', 1736928000, 'UTC')
+                await db.set_departure(user_id, shift_id, 1736956800)
+            except sqlite3.OperationalError:
+                stats['locked'] += 1
+                continue
+            stats['write_latency'].append(time.perf_counter() - started)
+            stats['writes'] += 2
+
+    async def report(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            user_id = rng.randint(1, users)
+            month = (START_DATE + timedelta(days=rng.randrange(DAYS_PER_USER))).strftime('%Y-%m')
+            started = time.perf_counter()
+            try:
+                await month_totals(db, user_id, month)
+                await db.get_date_page(user_id, month, None, True, 9)
+            except sqlite3.OperationalError:
+                stats['locked'] += 1
+                continue
+            stats['read_latency'].append(time.perf_counter() - started)
+            stats['reads'] += 3
+
+    await asyncio.gather(*(clock_in() for _ in range(writers)), *(report(seed) for seed in range(readers)))
+    await db.stop()
+    db.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=8, help='паралельних клієнтів із відмітками')
+    parser.add_argument('--readers', type=int, default=16, help='паралельних клієнтів зі звітами')
+    parser.add_argument('--profiles', nargs='+', default=list(STORAGE_PROFILES), choices=list(STORAGE_PROFILES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.db')
+        build_database(template, args.users)
+        print(f"{'профіль':>12} {'запис/с':>9} {'читання/с':>10} {'запис p95, мс':>14} "
+              f"{'читання p50, мс':>16} {'читання p95, мс':>16} {'locked':>7}")
+        for profile in args.profiles:
+            path = os.path.join(tmp, f'{profile}.db')
+            shutil.copy(template, path)
+            stats = asyncio.run(run_profile(path, profile, args.users, args.writers, args.readers, args.duration))
+            print(f"{profile:>12} {stats['writes'] / args.duration:>9.0f} {stats['reads'] / args.duration:>10.0f} "
+                  f"{percentile(stats['write_latency'], 0.95) * 1e3:>14.2f} "
+                  f"{percentile(stats['read_latency'], 0.5) * 1e3:>16.2f} "
+                  f"{percentile(stats['read_latency'], 0.95) * 1e3:>16.2f} {stats['locked']:>7}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
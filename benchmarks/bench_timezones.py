@@ -0,0 +1,88 @@
+"""Бенчмарк перетворень часу змін: pytz на кожен запис проти таблиць timezones.
+
+Генерує зміни за кілька років у часових поясах бота (зокрема моменти біля
+переходів на літній і зимовий час) і для кожної рахує місцевий час приходу
+й відходу та секунди епохи для введеного вручну часу — спершу так, як це
+робилося через pytz.timezone/localize/fromtimestamp, потім через
+timezones.zone_offsets. Результати обох способів звіряються.
+
+Приклад:
+    python benchmarks/bench_timezones.py --records 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from timezones import zone_offsets  # noqa: E402
+
+ZONES = ['Europe/Warsaw', 'Europe/Kyiv', 'UTC', 'America/New_York', 'Asia/Tokyo']
+YEARS = range(2022, 2027)
+
+
+def generate(records: int) -> list:
+    """(пояс, початок, кінець, дата, місцевий час) для випадкових змін, кожна десята — біля переходу"""
+    rng = random.Random(42)
+    first = int(datetime(YEARS[0], 1, 1).timestamp())
+    last = int(datetime(YEARS[-1] + 1, 1, 1).timestamp())
+    transitions = {name: [int((moment - datetime(1970, 1, 1)).total_seconds())
+                          for moment in getattr(pytz.timezone(name), '_utc_transition_times', [])
+                          if moment.year in YEARS] for name in ZONES}
+    shifts = []
+    for index in range(records):
+        name = ZONES[index % len(ZONES)]
+        if index % 10 == 0 and transitions[name]:
+            start_at = rng.choice(transitions[name]) + rng.randrange(-5 * 3600, 3600)
+        else:
+            start_at = rng.randrange(first, last)
+        local = datetime(1970, 1, 1) + timedelta(seconds=start_at + rng.randrange(-3600, 3600))
+        shifts.append((name, start_at, start_at + 30600, local.strftime('%Y-%m-%d'), local.strftime('%H:%M:%S')))
+    return shifts
+
+
+def with_pytz(shifts) -> list:
+    result = []
+    for name, start_at, end_at, date, clock in shifts:
+        arrival = datetime.fromtimestamp(start_at, pytz.timezone(name)).strftime('%H:%M:%S')
+        departure = datetime.fromtimestamp(end_at, pytz.timezone(name)).strftime('%H:%M:%S')
+        local = datetime.strptime(f"{date} {clock}", '%Y-%m-%d %H:%M:%S')
+        result.append((arrival, departure, int(pytz.timezone(name).localize(local).timestamp())))
+    return result
+
+
+def with_tables(shifts) -> list:
+    result = []
+    for name, start_at, end_at, date, clock in shifts:
+        offsets = zone_offsets(name)
+        result.append((offsets.clock(start_at), offsets.clock(end_at), offsets.to_epoch(date, clock)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    args = parser.parse_args()
+
+    shifts = generate(args.records)
+    timings = {}
+    results = {}
+    for label, convert in (('pytz', with_pytz), ('таблиці', with_tables)):
+        started = time.perf_counter()
+        results[label] = convert(shifts)
+        timings[label] = time.perf_counter() - started
+    mismatches = sum(1 for old, new in zip(results['pytz'], results['таблиці']) if old != new)
+
+    print(f"{'спосіб':>9} {'мкс/запис':>10} {'прискорення':>12}")
+    for label, seconds in timings.items():
+        print(f"{label:>9} {seconds / len(shifts) * 1e6:>10.2f} {timings['pytz'] / seconds:>11.1f}x")
+    print(f"розбіжностей: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Бенчмарк доставки оновлень: webhook проти long polling.
+
+Замість Telegram працює локальна імітація: оновлення з'являються з заданою
+частотою (або всі одразу з --rate 0), у режимі polling їх забирає
+getUpdates, у режимі webhook «Telegram» надсилає кожне POST-запитом на
+вбудований HTTP-сервер бота з секретним токеном, тримаючи до
+--max-connections одночасних з'єднань. --rtt імітує мережеву затримку
+в обидва боки. Затримка — від появи оновлення до завершення обробника.
+
+Приклад:
+    python benchmarks/bench_webhook.py --updates 5000 --rate 500 --rtt 0.05
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+
+BOT_TOKEN = '123456:bench'
+SECRET = 'bench-secret'
+
+
+def make_update(update_id: int) -> dict:
+    user_id = 1000 + update_id % 500
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'text': '⏱ Записати час',
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench'}}}
+
+
+class FakeTelegram(BaseRequest):
+    """Імітація Bot API: getUpdates повертає накопичені оновлення з довгим очікуванням"""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.pending = []
+        self.arrived = asyncio.Event()
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def publish(self, update: dict):
+        self.pending.append(update)
+        self.arrived.set()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        await asyncio.sleep(self.rtt / 2)
+        if endpoint == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        elif endpoint == 'getUpdates':
+            offset = parameters.get('offset', 0)
+            self.pending = [update for update in self.pending if update['update_id'] >= offset]
+            if not self.pending:
+                self.arrived.clear()
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), timeout=parameters.get('timeout', 0))
+                except asyncio.TimeoutError:
+                    pass
+            result = self.pending[:parameters.get('limit', 100)]
+        else:
+            result = True
+        await asyncio.sleep(self.rtt / 2)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def arrival_time(started: float, update_id: int, rate: float) -> float:
+    return started + (update_id - 1) / rate if rate else started
+
+
+async def post_over_connection(port, queue, rtt):
+    """Одне keep-alive з'єднання HTTP/1.1, як у Telegram: наступний запит після відповіді на попередній"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    while (update := await queue.get()) is not None:
+        await asyncio.sleep(rtt / 2)
+        body = json.dumps(update).encode()
+        writer.write(f'POST /telegram HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n'
+                     f'X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n'
+                     .encode() + body)
+        status = await reader.readline()
+        if b' 200 ' not in status:
+            raise RuntimeError(f"Вебхук відповів {status!r}")
+        length = 0
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode().partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        await reader.readexactly(length)
+    writer.close()
+
+
+async def post_updates(port, updates, rate, rtt, max_connections, started_queue):
+    queue = asyncio.Queue()
+    workers = [asyncio.create_task(post_over_connection(port, queue, rtt)) for _ in range(max_connections)]
+    started = time.perf_counter()
+    started_queue.put(started)
+    for update_id in range(1, updates + 1):
+        delay = arrival_time(started, update_id, rate) - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        queue.put_nowait(make_update(update_id))
+    for _ in workers:
+        queue.put_nowait(None)
+    await asyncio.gather(*workers)
+
+
+def send_updates(*args):
+    """Точка входу процесу-відправника для режиму webhook"""
+    asyncio.run(post_updates(*args))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run(mode, updates, rate, rtt, max_connections):
+    telegram = FakeTelegram(rtt)
+    application = (Application.builder().token(BOT_TOKEN)
+                   .request(telegram).get_updates_request(telegram).build())
+    handled_at = {}
+    finished = asyncio.Event()
+
+    async def record(update: Update, context):
+        handled_at[update.update_id] = time.perf_counter()
+        if len(handled_at) == updates:
+            finished.set()
+
+    application.add_handler(TypeHandler(Update, record))
+    await application.initialize()
+    port = free_port()
+    if mode == 'polling':
+        await application.updater.start_polling(poll_interval=0, timeout=10)
+    else:
+        await application.updater.start_webhook(listen='127.0.0.1', port=port, url_path='telegram',
+                                                webhook_url=f'http://127.0.0.1:{port}/telegram',
+                                                secret_token=SECRET, max_connections=max_connections)
+    await application.start()
+
+    if mode == 'polling':
+        started = time.perf_counter()
+        for update_id in range(1, updates + 1):
+            delay = arrival_time(started, update_id, rate) - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            telegram.publish(make_update(update_id))
+    else:
+        context = multiprocessing.get_context('spawn')
+        started_queue = context.Queue()
+        sender = context.Process(target=send_updates,
+                                 args=(port, updates, rate, rtt, max_connections, started_queue))
+        sender.start()
+        started = await asyncio.get_running_loop().run_in_executor(None, started_queue.get)
+    await asyncio.wait_for(finished.wait(), timeout=300)
+    elapsed = max(handled_at.values()) - started
+    if mode == 'webhook':
+        sender.join()
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    latencies = sorted(handled - arrival_time(started, update_id, rate) for update_id, handled in handled_at.items())
+    return {
+        'throughput': updates / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=0, help='оновлень за секунду; 0 — всі одразу')
+    parser.add_argument('--rtt', type=float, default=0.05, help='імітована мережева затримка туди й назад, с')
+    parser.add_argument('--max-connections', type=int, default=40)
+    parser.add_argument('--modes', nargs='+', default=['polling', 'webhook'], choices=['polling', 'webhook'])
+    args = parser.parse_args()
+    print(f"{'режим':>8} {'оновлень/с':>11} {'p50, мс':>9} {'p99, мс':>9}")
+    for mode in args.modes:
+        result = asyncio.run(run(mode, args.updates, args.rate, args.rtt, args.max_connections))
+        print(f"{mode:>8} {result['throughput']:>11.0f} {result['p50'] * 1e3:>9.1f} {result['p99'] * 1e3:>9.1f}",
+              flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Локальна імітація Bot API для бенчмарків, що проганяють справжні обробники бота.
+
+FakeBotAPI підставляється в Application як мережевий рівень (BaseRequest):
+запити не йдуть у Telegram, а записуються в `sent`, відповіді будуються
+локально, а `latency` імітує час відповіді API. run_isolated запускає
+прогін в окремому процесі з чистою робочою текою, бо бот тримає сховище
+й кеші в глобальних змінних модуля main.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+
+
+class FakeBotAPI(BaseRequest):
+    """Записує вихідні запити бота і відповідає так, як відповів би Telegram"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = []
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, parameters) -> dict:
+        return {'message_id': next(self._message_ids), 'date': 0, 'from': BOT_USER,
+                'chat': {'id': int(parameters.get('chat_id', 0)), 'type': 'private'},
+                'text': str(parameters.get('text', ''))}
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint == 'getUpdates':
+            # Оновлення подаються напряму в application.update_queue
+            await asyncio.sleep(parameters.get('timeout', 0) or 0)
+            result = []
+        else:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            self.sent.append((endpoint, parameters))
+            if endpoint in ('sendMessage', 'sendDocument', 'editMessageText'):
+                result = self._message(parameters)
+            elif endpoint == 'getChatMember':
+                user_id = int(parameters['user_id'])
+                result = {'status': 'member',
+                          'user': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}}
+            else:
+                result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    def replies(self, chat_id: int) -> list:
+        """Тексти повідомлень, надісланих у чат, у порядку відправлення"""
+        return [parameters.get('text') for endpoint, parameters in self.sent
+                if endpoint == 'sendMessage' and int(parameters.get('chat_id', 0)) == chat_id]
+
+
+_update_ids = itertools.count(1)
+
+
+def message_update(bot, user_id: int, text: str) -> Update:
+    """Оновлення з текстовим повідомленням користувача в особистому чаті"""
+    update_id = next(_update_ids)
+    message = {'message_id': update_id, 'date': 0, 'text': text,
+               'chat': {'id': user_id, 'type': 'private'},
+               'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'language_code': 'uk'}}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return Update.de_json({'update_id': update_id, 'message': message}, bot)
+
+
+def callback_update(bot, user_id: int, data: str) -> Update:
+    """Оновлення з натисканням inline-кнопки під повідомленням бота"""
+    update_id = next(_update_ids)
+    return Update.de_json({'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'chat_instance': str(user_id), 'data': data,
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'},
+        'message': {'message_id': update_id, 'date': 0, 'text': '', 'from': BOT_USER,
+                    'chat': {'id': user_id, 'type': 'private'}}}}, bot)
+
+
+def percentile(samples: list, q: float) -> float:
+    """q-й перцентиль (0-100) відсортованого списку"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+def _run_in_workdir(target, args, results):
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings('ignore', message=".*per_message")
+    try:
+        results.put(target(*args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_isolated(target, *args):
+    """Виконує target(*args) в окремому процесі в тимчасовій теці й повертає результат"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_in_workdir, args=(target, args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
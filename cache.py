@@ -0,0 +1,110 @@
+import itertools
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Обмежений за розміром кеш із витісненням найдавніше використаних записів.
+
+    Рахує влучання та промахи для `get`; `peek` читає значення без впливу
+    на статистику і порядок витіснення. Якщо задано on_evict(key, value),
+    він викликається для кожного витісненого через переповнення запису.
+    """
+
+    def __init__(self, maxsize: int = 10000, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        return self._data.get(key, default)
+
+    def put(self, key, value) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            evicted_key, evicted_value = self._data.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted_key, evicted_value)
+
+    def invalidate(self, key) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class VersionedCache:
+    """Обмежений LRU-кеш значень, обчислених з даних власника (користувача).
+
+    До ключа запису додається версія даних власника. `bump` після кожного
+    запису його даних видає власнику нову версію, тож старі значення більше
+    не знаходяться і витісняються як найдавніше використані — без обходу
+    кешу. Версію варто взяти до обчислення значення і передати в `put`:
+    якщо дані змінилися під час обчислення, значення ляже під застарілу
+    версію і не буде віддане.
+
+    Версії власників теж зберігаються в обмеженому LRU. Номери видає один
+    лічильник на весь кеш, тож власник, чию версію витіснено, отримує номер,
+    якого ще не було, і його старі записи вже не збігаються.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self._entries = LRUCache(maxsize)
+        self._versions = LRUCache(maxsize)
+        self._counter = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def version(self, owner) -> int:
+        version = self._versions.get(owner)
+        if version is None:
+            version = next(self._counter)
+            self._versions.put(owner, version)
+        return version
+
+    def bump(self, owner) -> None:
+        self._versions.put(owner, next(self._counter))
+
+    def get(self, owner, key, default=None):
+        return self._entries.get((owner, self.version(owner), key), default)
+
+    def put(self, owner, version: int, key, value) -> None:
+        self._entries.put((owner, version, key), value)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), 'owners': len(self._versions)}
@@ -0,0 +1,39 @@
+from types import MappingProxyType
+
+
+class Catalog:
+    """Скомпільовані каталоги перекладів.
+
+    Під час створення кожна мова перетворюється на незмінну таблицю, в яку
+    вже підставлено тексти мови за замовчуванням для відсутніх ключів, тож
+    `text` — два звертання до словника без ланцюжка запасних варіантів.
+    Зворотний індекс зіставляє будь-який текст будь-якої мови з його
+    ключем: натиснута кнопка розпізнається одним пошуком незалежно від
+    того, якою мовою користувач бачив клавіатуру.
+    """
+
+    def __init__(self, languages: dict, default: str):
+        base = languages[default]
+        self.default = default
+        self._tables = MappingProxyType({
+            code: MappingProxyType({**base, **texts}) for code, texts in languages.items()
+        })
+        self._fallback = self._tables[default]
+        actions = {}
+        for code, texts in languages.items():
+            for key, text in texts.items():
+                if actions.setdefault(text, key) != key:
+                    raise ValueError(f"Текст {text!r} мови {code} збігається для ключів {actions[text]} і {key}")
+        self._actions = MappingProxyType(actions)
+
+    @property
+    def languages(self) -> tuple:
+        return tuple(self._tables)
+
+    def text(self, language: str, key: str) -> str:
+        """Текст ключа мовою language; для невідомої мови — мовою за замовчуванням, для невідомого ключа — сам ключ"""
+        return self._tables.get(language, self._fallback).get(key, key)
+
+    def action(self, text: str):
+        """Ключ, текст якого будь-якою мовою дорівнює text, або None"""
+        return self._actions.get(text)
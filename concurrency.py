@@ -0,0 +1,61 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Паралельна обробка оновлень різних користувачів зі збереженням порядку для кожного.
+
+    Оновлення одного користувача (або чату, якщо користувача немає)
+    обробляються строго послідовно в порядку надходження, тож переходи
+    ConversationHandler і записи в базу одного користувача не змагаються.
+    Блокування користувача береться до загального ліміту, щоб черга
+    оновлень одного користувача не займала слоти інших. Блокування
+    видаляється, щойно в нього не лишається очікувачів.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # ключ -> [asyncio.Lock, кількість оновлень, що тримають або чекають блокування]
+        self._locks = {}
+
+    @staticmethod
+    def _key(update):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+    @property
+    def pending_users(self) -> int:
+        """Кількість користувачів з оновленнями в обробці або в черзі"""
+        return len(self._locks)
+
+    async def process_update(self, update, coroutine) -> None:
+        key = self._key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
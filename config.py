@@ -0,0 +1,50 @@
+"""Налаштування запуску бота зі змінних середовища"""
+import os
+import secrets
+
+from storage import DEFAULT_PROFILE
+
+# Профіль SQLite з storage.STORAGE_PROFILES (wal, wal-durable, rollback)
+DB_PROFILE = os.environ.get('TIMEKEEPER_DB_PROFILE', DEFAULT_PROFILE)
+
+# Скільки оновлень різних користувачів обробляються одночасно; оновлення одного користувача — завжди по черзі
+CONCURRENT_UPDATES = int(os.environ.get('TIMEKEEPER_CONCURRENT_UPDATES', '32'))
+
+# Спосіб отримання оновлень: polling (getUpdates) або webhook (вбудований HTTP-сервер)
+RUN_MODE = os.environ.get('TIMEKEEPER_MODE', 'polling')
+RUN_MODES = ('polling', 'webhook')
+
+# Публічна HTTPS-адреса, на яку Telegram надсилатиме оновлення (без шляху)
+WEBHOOK_URL = os.environ.get('TIMEKEEPER_WEBHOOK_URL')
+WEBHOOK_LISTEN = os.environ.get('TIMEKEEPER_WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('TIMEKEEPER_WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.environ.get('TIMEKEEPER_WEBHOOK_PATH', 'telegram')
+# Telegram передає секрет у заголовку X-Telegram-Bot-Api-Secret-Token; без налаштування генерується при кожному старті
+WEBHOOK_SECRET = os.environ.get('TIMEKEEPER_WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+# Скільки одночасних HTTPS-з'єднань Telegram може відкрити до вебхука (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('TIMEKEEPER_WEBHOOK_MAX_CONNECTIONS', '40'))
+# Сертифікат і ключ для TLS без зворотного проксі
+WEBHOOK_CERT = os.environ.get('TIMEKEEPER_WEBHOOK_CERT')
+WEBHOOK_KEY = os.environ.get('TIMEKEEPER_WEBHOOK_KEY')
+
+# Порт HTTP-ендпоінта /metrics у форматі Prometheus; без налаштування ендпоінт вимкнено
+METRICS_PORT = int(os.environ['TIMEKEEPER_METRICS_PORT']) if os.environ.get('TIMEKEEPER_METRICS_PORT') else None
+METRICS_LISTEN = os.environ.get('TIMEKEEPER_METRICS_LISTEN', '127.0.0.1')
+
+# Трасування SQL: off, slow (лише повільні інструкції) або all; журнал з EXPLAIN QUERY PLAN пишеться в окремий файл
+SQL_TRACE = os.environ.get('TIMEKEEPER_SQL_TRACE', 'off')
+SLOW_QUERY_MS = float(os.environ.get('TIMEKEEPER_SLOW_QUERY_MS', '50'))
+SLOW_QUERY_LOG = os.environ.get('TIMEKEEPER_SLOW_QUERY_LOG', 'slow_queries.log')
+
+# Забуті зміни: відкриті довше за SHIFT_MAX_HOURS годин закриваються через звичайну тривалість зміни (close)
+# або лише позначаються (flag); перевірка — раз на SHIFT_SWEEP_INTERVAL секунд пачками по SHIFT_SWEEP_BATCH змін
+SHIFT_MAX_HOURS = float(os.environ.get('TIMEKEEPER_SHIFT_MAX_HOURS', '16'))
+SHIFT_SWEEP_ACTION = os.environ.get('TIMEKEEPER_SHIFT_SWEEP_ACTION', 'close')
+SHIFT_SWEEP_INTERVAL = float(os.environ.get('TIMEKEEPER_SHIFT_SWEEP_INTERVAL', '300'))
+SHIFT_SWEEP_BATCH = int(os.environ.get('TIMEKEEPER_SHIFT_SWEEP_BATCH', '200'))
+
+# Скільки змін, днів або місяців показує одна сторінка інлайн-списків редагування та історії
+LIST_PAGE_SIZE = int(os.environ.get('TIMEKEEPER_LIST_PAGE_SIZE', '8'))
+
+# Скільки готових текстів звітів тримати в кеші; записи застарілих версій даних більше не читаються й витісняються
+REPORT_CACHE_SIZE = int(os.environ.get('TIMEKEEPER_REPORT_CACHE_SIZE', '10000'))
@@ -0,0 +1,45 @@
+from telegram import KeyboardButton, ReplyKeyboardMarkup
+
+
+class PrebuiltKeyboardMarkup(ReplyKeyboardMarkup):
+    """ReplyKeyboardMarkup, серіалізована один раз під час створення.
+
+    PTB викликає to_dict() для розмітки під час кожного надсилання;
+    готовий словник повертається без повторного обходу кнопок.
+    """
+
+    __slots__ = ('_serialized',)
+
+    def __init__(self, keyboard, **kwargs):
+        super().__init__(keyboard, **kwargs)
+        with self._unfrozen():
+            self._serialized = super().to_dict()
+
+    def to_dict(self, recursive: bool = True) -> dict:
+        if not recursive:
+            return super().to_dict(recursive=False)
+        return dict(self._serialized)
+
+
+class KeyboardRegistry:
+    """Клавіатури меню, зібрані один раз для кожної мови каталогу.
+
+    layouts: назва -> функція text(key) -> рядки клавіатури; `get`
+    повертає готову розмітку без повторного перекладу й серіалізації.
+    """
+
+    def __init__(self, catalog, layouts: dict):
+        self._catalog = catalog
+        self._markups = {}
+        for language in catalog.languages:
+            for name, layout in layouts.items():
+                rows = tuple(tuple(KeyboardButton(text) for text in row)
+                             for row in layout(lambda key: catalog.text(language, key)))
+                self._markups[(name, language)] = PrebuiltKeyboardMarkup(rows, resize_keyboard=True)
+
+    def _key(self, name, language):
+        return (name, language) if (name, language) in self._markups else (name, self._catalog.default)
+
+    def get(self, name: str, language: str) -> ReplyKeyboardMarkup:
+        """Готова клавіатура меню name мовою language (невідома мова — мова за замовчуванням)"""
+        return self._markups[self._key(name, language)]
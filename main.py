@@ -1,16 +1,78 @@
+import io
 import logging
 import sqlite3
 import asyncio
 from datetime import datetime, timedelta
-import pytz
+from functools import partial
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, Document, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackContext, filters, ConversationHandler, ContextTypes, CallbackQueryHandler
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackContext, filters, ConversationHandler, ContextTypes, CallbackQueryHandler, TypeHandler
+from storage import Storage
+from cache import LRUCache, VersionedCache
+from catalog import Catalog
+from keyboards import KeyboardRegistry
+from paging import NEWER, OLDER, SELECT, callback_pattern, load_page, page_markup, parse_callback
+from reports import month_totals, local_epoch
+from timezones import get_zone
+from scheduler import ReminderScheduler
+from profiles import UserProfiles
+from persistence import SQLitePersistence
+from outbox import PriorityRateLimiter, PRIORITY_REMINDER, PRIORITY_ADMIN
+from concurrency import PerUserUpdateProcessor
+from metrics import HandlerMetrics, MetricsServer
+from sqltrace import QueryProfiler
+from sweeper import ShiftSweeper
+import config
 
-# Словник для збереження стану користувачів
-user_states = {}
+# Асинхронне сховище даних бота; з TIMEKEEPER_SQL_TRACE кожна операція проходить через профайлер SQL
+query_profiler = None
+if config.SQL_TRACE != 'off':
+    query_profiler = QueryProfiler(config.SQL_TRACE, config.SLOW_QUERY_MS, config.SLOW_QUERY_LOG)
+db = Storage(profile=config.DB_PROFILE, profiler=query_profiler)
 
-# Глобальний словник для зберігання запланованих нагадувань
-scheduled_reminders = {}
+# Кеш налаштувань користувачів (мова, часовий пояс, ставка)
+user_settings = LRUCache(maxsize=10000)
+
+# Готові тексти звітів за (користувач, вид, період, мова) у межах версії даних користувача;
+# кожен запис змін, ставки чи підсумків викликає rendered_reports.bump(user_id)
+rendered_reports = VersionedCache(maxsize=config.REPORT_CACHE_SIZE)
+
+# Локальний кеш профілів користувачів Telegram, щоб не повторювати запити до API
+user_profiles = UserProfiles(db)
+persistence = SQLitePersistence(db)
+outbox = PriorityRateLimiter()
+
+# Затримка, помилки та SQL-інструкції кожного обробника (/metrics і, за налаштування, HTTP для Prometheus)
+handler_metrics = HandlerMetrics()
+handler_metrics.add_gauge('db_statements', "SQL-інструкцій від старту", lambda: db.statements)
+handler_metrics.add_gauge('outbox_backlog', "Повідомлень у черзі відправлення",
+                          lambda: sum(outbox.stats()['backlog'].values()))
+handler_metrics.add_gauge('sessions_resident', "Сесій у пам'яті", lambda: persistence.stats()['size'])
+handler_metrics.add_gauge('settings_cache_size', "Налаштувань користувачів у кеші",
+                          lambda: user_settings.stats()['size'])
+handler_metrics.add_gauge('settings_cache_hit_rate', "Частка налаштувань, відданих з кешу",
+                          lambda: user_settings.stats()['hit_rate'])
+handler_metrics.add_gauge('report_cache_size', "Звітів у кеші", lambda: len(rendered_reports))
+handler_metrics.add_gauge('report_cache_hit_rate', "Частка звітів, відданих з кешу",
+                          lambda: rendered_reports.stats()['hit_rate'])
+handler_metrics.add_gauge('shifts_swept', "Забутих змін оброблено від старту", lambda: shift_sweeper.swept)
+metrics_server = MetricsServer(handler_metrics, config.METRICS_LISTEN, config.METRICS_PORT) if config.METRICS_PORT else None
+
+# Максимальна кількість одночасних запитів до Telegram API під час експорту
+EXPORT_CONCURRENCY = 20
+
+# Планувальник нагадувань про кінець зміни
+reminders = ReminderScheduler(db)
+
+# Звичайна тривалість зміни: очікуваний кінець і час автоматичного закриття забутої зміни
+SHIFT_DURATION = timedelta(hours=8)
+
+# Скільки після приходу незакрита зміна вважається поточною; давніші забуті зміни відхід не закриває
+OPEN_SHIFT_WINDOW = timedelta(hours=48)
+
+# Фоновий прибиральник змін, які забули закрити; давніші за OPEN_SHIFT_WINDOW лише позначаються
+shift_sweeper = ShiftSweeper(db, config.SHIFT_SWEEP_INTERVAL, config.SHIFT_MAX_HOURS * 3600, config.SHIFT_SWEEP_BATCH,
+                             config.SHIFT_SWEEP_ACTION, SHIFT_DURATION.total_seconds(),
+                             OPEN_SHIFT_WINDOW.total_seconds())
 
 # Список популярних часових поясів
 AVAILABLE_TIMEZONES = [
@@ -70,11 +132,12 @@ LANGUAGES = {
         'settings_title': '⚙️ Налаштування:',
         'arrival_recorded': '✅ Час приходу записано:',
         'departure_recorded': '✅ Час відходу записано:',
-        'already_recorded_arrival': '❌ Ви вже записали час приходу сьогодні!',
-        'already_recorded_departure': '❌ Ви вже записали час відходу сьогодні!',
+        'already_recorded_arrival': '❌ У вас уже є відкрита зміна — спочатку запишіть час відходу!',
         'record_arrival_first': '❌ Спочатку запишіть час приходу!',
         'expected_shift_end': '🕐 Очікуваний кінець зміни:',
         'shift_end_reminder': '⚠️ Увага! Через 15 хвилин закінчується ваша зміна ({}).\nНе забудьте відмітити час відходу!',
+        'shift_auto_closed': '⚠️ Ви не відмітили відхід для зміни {} з {}.\nЗміну автоматично закрито о {} — за потреби виправте час у «✏️ Редагувати».',
+        'shift_left_open': '⚠️ Зміна {} з {} досі не закрита і не враховується в підсумках.\nВкажіть час відходу в «✏️ Редагувати».',
         'no_records_today': '❌ За сьогодні немає записів.',
         'no_records_month': '❌ За цей місяць немає записів.',
         'worked_today': '⏱ Відпрацьовано сьогодні:',
@@ -119,7 +182,6 @@ LANGUAGES = {
         'invalid_time_format': '❌ Неправильний формат часу. Будь ласка, використовуйте формат ГГ:ХХ або ГГ:ХХ:СС',
         'enter_date_format': 'Введіть дату у форматі РРРР-ММ-ДД (наприклад, 2025-01-09):',
         'no_future_dates': '❌ Не можна створювати записи для майбутніх дат!',
-        'record_exists': '❌ Запис за цю дату вже існує!',
         'enter_arrival_time': '⌚ Введіть час приходу у форматі ГГ:ХХ або ГГ:ХХ:СС (наприклад, 09:00 або 09:00:00):',
         'arrival_time_saved': '✅ Час приходу записано!\n\n⌚ Тепер введіть час відходу у форматі ГГ:ХХ або ГГ:ХХ:СС (наприклад, 18:00 або 18:00:00):',
         'departure_time_saved': '✅ Час відходу записано!',
@@ -135,9 +197,9 @@ LANGUAGES = {
         'night_shift': 'Нічна зміна (з вчора):',
         'monthly_report_title': '📈 Звіт за {}:',
         'choose_month': '📅 Оберіть місяць для перегляду:',
-        'select_specific_day': '📅 Обрати конкретний день',
         'back_to_month_selection': '↩️ Назад до вибору місяця',
         'choose_day_detail': '📅 Оберіть день для детального перегляду:',
+        'choose_from_list': '🗂 Оберіть зі списку:',
         'back_to_report': '↩️ Назад до звіту',
         'detailed_report_for': '📅 Детальний звіт за {}:',
         'worked': '⏱ Відпрацьовано:',
@@ -167,11 +229,12 @@ LANGUAGES = {
         'settings_title': '⚙️ Settings:',
         'arrival_recorded': '✅ Arrival time recorded:',
         'departure_recorded': '✅ Departure time recorded:',
-        'already_recorded_arrival': '❌ You have already recorded arrival time today!',
-        'already_recorded_departure': '❌ You have already recorded departure time today!',
+        'already_recorded_arrival': '❌ You already have an open shift — record departure time first!',
         'record_arrival_first': '❌ Please record arrival time first!',
         'expected_shift_end': '🕐 Expected shift end:',
         'shift_end_reminder': '⚠️ Attention! Your shift ends in 15 minutes ({}).\nDon\'t forget to record departure time!',
+        'shift_auto_closed': '⚠️ You did not record departure for the shift on {} from {}.\nIt was closed automatically at {} — fix the time in «✏️ Edit» if needed.',
+        'shift_left_open': '⚠️ The shift on {} from {} is still open and is not counted in totals.\nSet the departure time in «✏️ Edit».',
         'no_records_today': '❌ No records for today.',
         'no_records_month': '❌ No records for this month.',
         'worked_today': '⏱ Worked today:',
@@ -216,7 +279,6 @@ LANGUAGES = {
         'invalid_time_format': '❌ Invalid time format. Please use HH:MM or HH:MM:SS format',
         'enter_date_format': 'Enter date in YYYY-MM-DD format (e.g., 2025-01-09):',
         'no_future_dates': '❌ Cannot create records for future dates!',
-        'record_exists': '❌ Record for this date already exists!',
         'enter_arrival_time': '⌚ Enter arrival time in HH:MM or HH:MM:SS format (e.g., 09:00 or 09:00:00):',
         'arrival_time_saved': '✅ Arrival time saved!\n\n⌚ Now enter departure time in HH:MM or HH:MM:SS format (e.g., 18:00 or 18:00:00):',
         'departure_time_saved': '✅ Departure time saved!',
@@ -232,9 +294,9 @@ LANGUAGES = {
         'night_shift': 'Night shift (from yesterday):',
         'monthly_report_title': '📈 Report for {}:',
         'choose_month': '📅 Choose month to view:',
-        'select_specific_day': '📅 Select specific day',
         'back_to_month_selection': '↩️ Back to month selection',
         'choose_day_detail': '📅 Choose day for detailed view:',
+        'choose_from_list': '🗂 Choose from the list:',
         'back_to_report': '↩️ Back to report',
         'detailed_report_for': '📅 Detailed report for {}:',
         'worked': '⏱ Worked:',
@@ -264,11 +326,12 @@ LANGUAGES = {
         'settings_title': '⚙️ Ustawienia:',
         'arrival_recorded': '✅ Czas przyjścia zapisany:',
         'departure_recorded': '✅ Czas wyjścia zapisany:',
-        'already_recorded_arrival': '❌ Już zapisałeś czas przyjścia dzisiaj!',
-        'already_recorded_departure': '❌ Już zapisałeś czas wyjścia dzisiaj!',
+        'already_recorded_arrival': '❌ Masz już otwartą zmianę — najpierw zapisz czas wyjścia!',
         'record_arrival_first': '❌ Najpierw zapisz czas przyjścia!',
         'expected_shift_end': '🕐 Oczekiwany koniec zmiany:',
         'shift_end_reminder': '⚠️ Uwaga! Za 15 minut kończy się Twoja zmiana ({}).\nNie zapomnij zapisać czasu wyjścia!',
+        'shift_auto_closed': '⚠️ Nie zapisałeś wyjścia dla zmiany {} od {}.\nZmiana została automatycznie zamknięta o {} — w razie potrzeby popraw czas w «✏️ Edytuj».',
+        'shift_left_open': '⚠️ Zmiana {} od {} jest nadal otwarta i nie jest wliczana do sum.\nPodaj czas wyjścia w «✏️ Edytuj».',
         'no_records_today': '❌ Brak zapisów na dzisiaj.',
         'no_records_month': '❌ Brak zapisów w tym miesiącu.',
         'worked_today': '⏱ Przepracowano dzisiaj:',
@@ -313,7 +376,6 @@ LANGUAGES = {
         'invalid_time_format': '❌ Nieprawidłowy format czasu. Użyj formatu GG:MM lub GG:MM:SS',
         'enter_date_format': 'Wprowadź datę w formacie RRRR-MM-DD (np. 2025-01-09):',
         'no_future_dates': '❌ Nie można tworzyć zapisów dla przyszłych dat!',
-        'record_exists': '❌ Zapis dla tej daty już istnieje!',
         'enter_arrival_time': '⌚ Wprowadź czas przyjścia w formacie GG:MM lub GG:MM:SS (np. 09:00 lub 09:00:00):',
         'arrival_time_saved': '✅ Czas przyjścia zapisany!\n\n⌚ Teraz wprowadź czas wyjścia w formacie GG:MM lub GG:MM:SS (np. 18:00 lub 18:00:00):',
         'departure_time_saved': '✅ Czas wyjścia zapisany!',
@@ -329,9 +391,9 @@ LANGUAGES = {
         'night_shift': 'Zmiana nocna (od wczoraj):',
         'monthly_report_title': '📈 Raport za {}:',
         'choose_month': '📅 Wybierz miesiąc do wyświetlenia:',
-        'select_specific_day': '📅 Wybierz konkretny dzień',
         'back_to_month_selection': '↩️ Powrót do wyboru miesiąca',
         'choose_day_detail': '📅 Wybierz dzień do szczegółowego wyświetlenia:',
+        'choose_from_list': '🗂 Wybierz z listy:',
         'back_to_report': '↩️ Powrót do raportu',
         'detailed_report_for': '📅 Szczegółowy raport za {}:',
         'worked': '⏱ Przepracowano:',
@@ -341,61 +403,78 @@ LANGUAGES = {
     }
 }
 
-def setup_database():
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS time_records
-        (date TEXT, 
-         user_id INTEGER,
-         arrival_time TEXT,
-         departure_time TEXT)
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS hourly_rates
-        (user_id INTEGER PRIMARY KEY,
-         rate DECIMAL(10,2))
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS user_timezones
-        (user_id INTEGER PRIMARY KEY,
-         timezone TEXT)
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS user_languages
-        (user_id INTEGER PRIMARY KEY,
-         language TEXT DEFAULT 'uk')
-    ''')
-    conn.commit()
-    conn.close()
+# Тексти всіх мов, скомпільовані один раз: get_text і розпізнавання кнопок будь-якою мовою
+catalog = Catalog(LANGUAGES, default='uk')
+
+# Кнопки вибору мови -> код мови
+LANGUAGE_ACTIONS = {'ukrainian': 'uk', 'english': 'en', 'polish': 'pl'}
+
+# Розкладки клавіатур меню: text(key) -> рядки кнопок; збираються один раз для кожної мови
+MENU_LAYOUTS = {
+    'main': lambda text: [[text('record_time'), text('report')], [text('settings')]],
+    'time_recording': lambda text: [[text('record_arrival'), text('record_departure')], [text('back')]],
+    'report': lambda text: [[text('daily_report'), text('monthly_report')], [text('edit_report'), text('back')]],
+    'edit_dates': lambda text: [[text('back')], [text('new_record'), text('delete_record')]],
+    'delete_dates': lambda text: [[text('back')]],
+    'new_record': lambda text: [[text('today_date')], [text('enter_manually')], [text('back')]],
+    'new_record_retry': lambda text: [[text('today_date')], [text('enter_manually')], [text('back')], [text('cancel')]],
+    'edit_time': lambda text: [[text('arrival_time'), text('departure_time')], [text('back')]],
+    'cancel': lambda text: [[text('cancel')]],
+    'settings': lambda text: [[text('reset_time'), text('set_rate')], [text('set_timezone'), text('set_language')],
+                              [text('history')], [text('back')]],
+    'timezones': lambda text: [[tz] for tz in AVAILABLE_TIMEZONES] + [[text('back')]],
+    'languages': lambda text: [[text('ukrainian')], [text('english')], [text('polish')], [text('back')]],
+    'months': lambda text: [[text('back')]],
+}
+keyboards = KeyboardRegistry(catalog, MENU_LAYOUTS)
+
+async def load_user_settings(user_id: int) -> dict:
+    """Отримати налаштування користувача з кешу або завантажити їх з бази даних одним запитом"""
+    settings = user_settings.get(user_id)
+    if settings is None:
+        language, timezone, rate = await db.get_user_settings(user_id)
+        settings = {
+            'language': language or 'uk',
+            'timezone': timezone or 'Europe/Warsaw',
+            'rate': rate,
+        }
+        user_settings.put(user_id, settings)
+    return settings
+
+async def refresh_user_settings(user_id: int) -> dict:
+    """Скинути кешовані налаштування після запису та завантажити їх заново"""
+    user_settings.invalidate(user_id)
+    return await load_user_settings(user_id)
+
+async def prepare_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Завантажує налаштування та оновлює профіль користувача перед обробкою кожного оновлення"""
+    if update.effective_user:
+        await load_user_settings(update.effective_user.id)
+        await user_profiles.remember(update.effective_user)
 
 def get_user_language(user_id: int) -> str:
-    """Отримати мову користувача з бази даних або повернути українську за замовчуванням"""
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('SELECT language FROM user_languages WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else 'uk'
+    """Отримати мову користувача або повернути українську за замовчуванням"""
+    return user_settings.peek(user_id, {}).get('language', 'uk')
 
 def get_text(user_id: int, key: str) -> str:
     """Отримати локалізований текст для користувача"""
-    language = get_user_language(user_id)
-    return LANGUAGES.get(language, LANGUAGES['uk']).get(key, LANGUAGES['uk'].get(key, key))
+    return catalog.text(get_user_language(user_id), key)
+
+def get_keyboard(user_id: int, name: str) -> ReplyKeyboardMarkup:
+    """Клавіатура меню name мовою користувача"""
+    return keyboards.get(name, get_user_language(user_id))
 
 def get_user_timezone(user_id: int) -> str:
-    """Отримати часовий пояс користувача з бази даних або повернути Europe/Warsaw за замовчуванням"""
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('SELECT timezone FROM user_timezones WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else 'Europe/Warsaw'
+    """Отримати часовий пояс користувача або повернути Europe/Warsaw за замовчуванням"""
+    return user_settings.peek(user_id, {}).get('timezone', 'Europe/Warsaw')
+
+def get_user_rate(user_id: int):
+    """Отримати погодинну ставку користувача або None, якщо її не встановлено"""
+    return user_settings.peek(user_id, {}).get('rate')
 
 def get_local_time(user_id: int) -> datetime:
     """Отримати поточний час у часовому поясі користувача"""
-    tz = pytz.timezone(get_user_timezone(user_id))
-    return datetime.now(tz)
+    return datetime.now(get_zone(get_user_timezone(user_id)))
 
 def parse_time_input(time_str: str) -> str:
     """Парсить введений час у форматі HH:MM або HH:MM:SS і повертає у форматі HH:MM:SS"""
@@ -415,10 +494,10 @@ def parse_time_input(time_str: str) -> str:
     except ValueError:
         raise ValueError("Неправильний формат часу")
 
-async def get_user_info(bot, user_id: int) -> dict:
+async def fetch_user_info(bot, user_id: int) -> dict:
     """Отримати інформацію про користувача з Telegram API"""
     try:
-        chat_member = await bot.get_chat_member(user_id, user_id)
+        chat_member = await bot.get_chat_member(user_id, user_id, rate_limit_args=PRIORITY_ADMIN)
         user = chat_member.user
         return {
             'id': user.id,
@@ -432,6 +511,29 @@ async def get_user_info(bot, user_id: int) -> dict:
         logger.error(f"Помилка отримання інформації про користувача: {e}")
         return None
 
+async def get_user_info(bot, user_id: int) -> dict:
+    """Отримати інформацію про користувача з локального кешу профілів, а для невідомих — з Telegram API"""
+    user_info = await user_profiles.get(user_id)
+    if user_info is None:
+        user_info = await fetch_user_info(bot, user_id)
+        if user_info:
+            await user_profiles.store(user_info)
+    return user_info
+
+async def get_users_info(bot, user_ids: list) -> dict:
+    """Отримати інформацію про кількох користувачів: відомих — одним запитом до БД,
+    решту — з Telegram API, не більше EXPORT_CONCURRENCY запитів одночасно"""
+    users_info = await user_profiles.get_many(user_ids)
+    semaphore = asyncio.Semaphore(EXPORT_CONCURRENCY)
+
+    async def fetch(user_id):
+        async with semaphore:
+            return user_id, await get_user_info(bot, user_id)
+
+    missing = [user_id for user_id in user_ids if user_id not in users_info]
+    users_info.update(await asyncio.gather(*(fetch(user_id) for user_id in missing)))
+    return users_info
+
 async def notify_admin_new_user(bot, user_info: dict):
     """Надсилає адміністратору сповіщення про нового користувача"""
     admin_id = 667685166
@@ -447,7 +549,7 @@ async def notify_admin_new_user(bot, user_info: dict):
     if user_info.get('language_code'):
         notification += f"Мова: {user_info['language_code']}\n"
     try:
-        await bot.send_message(chat_id=admin_id, text=notification)
+        await bot.send_message(chat_id=admin_id, text=notification, rate_limit_args=PRIORITY_ADMIN)
     except Exception as e:
         logger.error(f"Помилка відправки сповіщення адміністратору: {e}")
 
@@ -461,19 +563,8 @@ async def infouser_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return
     try:
         user_id = int(context.args[0])
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
-        c.execute('''
-            SELECT COUNT(*) as records,
-                   MIN(date) as first_record,
-                   MAX(date) as last_record
-            FROM time_records
-            WHERE user_id = ?
-        ''', (user_id,))
-        db_stats = c.fetchone()
-        c.execute('SELECT timezone FROM user_timezones WHERE user_id = ?', (user_id,))
-        timezone = c.fetchone()
-        conn.close()
+        db_stats = await db.get_user_stats(user_id)
+        timezone = await db.get_timezone(user_id)
         user_info = await get_user_info(context.bot, user_id)
         if user_info:
             message = (
@@ -485,7 +576,7 @@ async def infouser_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
                 message += f"Прізвище: {user_info['last_name']}\n"
             if user_info['username']:
                 message += f"Username: @{user_info['username']}\n"
-            message += f"Часовий пояс: {timezone[0] if timezone else 'Europe/Warsaw'}\n"
+            message += f"Часовий пояс: {timezone or 'Europe/Warsaw'}\n"
             message += f"\n📊 Статистика використання бота:\n"
             if db_stats[0] > 0:
                 message += (
@@ -504,111 +595,128 @@ async def infouser_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         logger.error(f"Помилка в команді infouser: {e}")
         await update.message.reply_text("❌ Виникла помилка при отриманні інформації.")
 
+async def metrics_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обробник команди /metrics: статистика обробників з моменту запуску"""
+    if update.effective_user.id != 667685166:
+        await update.message.reply_text("❌ У вас немає прав для використання цієї команди.")
+        return
+    await update.message.reply_text(handler_metrics.render_text())
+
+async def rebuild_totals_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обробник команди /rebuildtotals: звірка та перебудова зведених місячних підсумків"""
+    if update.effective_user.id != 667685166:
+        await update.message.reply_text("❌ У вас немає прав для використання цієї команди.")
+        return
+    try:
+        mismatches = await db.rebuild_monthly_totals()
+        if mismatches:
+            rendered_reports.clear()
+            logger.warning(f"Зведені місячні підсумки перебудовано, розбіжностей: {mismatches}")
+            await update.message.reply_text(f"🔧 Знайдено розбіжностей: {mismatches}. Зведені підсумки перебудовано.")
+        else:
+            await update.message.reply_text("✅ Зведені місячні підсумки узгоджені з записами.")
+    except Exception as e:
+        logger.error(f"Помилка в команді rebuildtotals: {e}")
+        await update.message.reply_text("❌ Виникла помилка при перевірці зведених підсумків.")
+
 async def export_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обробник команди /exportusers"""
     if update.effective_user.id != 667685166:
         await update.message.reply_text("❌ У вас немає прав для використання цієї команди.")
         return
     try:
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
-        c.execute('''
-            SELECT DISTINCT user_id,
-                   COUNT(*) as records,
-                   MIN(date) as first_record,
-                   MAX(date) as last_record
-            FROM time_records
-            GROUP BY user_id
-        ''')
-        users_data = c.fetchall()
-        c.execute('SELECT user_id, timezone FROM user_timezones')
-        timezones = {row[0]: row[1] for row in c.fetchall()}
-        conn.close()
+        users_data = await db.get_all_user_stats()
+        timezones = await db.get_all_timezones()
         if not users_data:
             await update.message.reply_text("❌ У базі даних немає користувачів.")
             return
-        report = "📊 Звіт по користувачам бота\n\n"
-        for user_data in users_data:
-            user_id, records_count, first_record, last_record = user_data
-            user_info = await get_user_info(context.bot, user_id)
+        users_info = await get_users_info(context.bot, [user_data[0] for user_data in users_data])
+        report = io.BytesIO()
+
+        def write(text):
+            report.write(text.encode('utf-8'))
+
+        write("📊 Звіт по користувачам бота\n\n")
+        for user_id, records_count, first_record, last_record in users_data:
+            user_info = users_info.get(user_id)
             if user_info:
-                report += (
+                write(
                     f"👤 Користувач ID: {user_id}\n"
                     f"Ім'я: {user_info['first_name']}\n"
                 )
                 if user_info['last_name']:
-                    report += f"Прізвище: {user_info['last_name']}\n"
+                    write(f"Прізвище: {user_info['last_name']}\n")
                 if user_info['username']:
-                    report += f"Username: @{user_info['username']}\n"
-                report += f"Часовий пояс: {timezones.get(user_id, 'Europe/Warsaw')}\n"
-                report += (
+                    write(f"Username: @{user_info['username']}\n")
+                write(f"Часовий пояс: {timezones.get(user_id, 'Europe/Warsaw')}\n")
+                write(
                     f"Кількість записів: {records_count}\n"
                     f"Перший запис: {first_record}\n"
                     f"Останній запис: {last_record}\n"
                     f"{'=' * 30}\n\n"
                 )
-        with open('users_report.txt', 'w', encoding='utf-8') as f:
-            f.write(report)
-        with open('users_report.txt', 'rb') as f:
-            await update.message.reply_document(
-                document=f,
-                filename='users_report.txt',
-                caption='📄 Звіт по всім користувачам бота'
-            )
-        import os
-        os.remove('users_report.txt')
+        report.seek(0)
+        await update.message.reply_document(
+            document=report,
+            filename='users_report.txt',
+            caption='📄 Звіт по всім користувачам бота'
+        )
     except Exception as e:
         logger.error(f"Помилка в команді export_users: {e}")
         await update.message.reply_text("❌ Виникла помилка при створенні звіту.")
 
 async def start(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    if user_id not in user_states:
-        user_states[user_id] = {'is_first_run': True}
+    if 'is_first_run' not in context.user_data:
+        context.user_data['is_first_run'] = True
         user_info = await get_user_info(context.bot, user_id)
         if user_info:
             await notify_admin_new_user(context.bot, user_info)
-    if user_states[user_id]['is_first_run']:
-        user_states[user_id]['is_first_run'] = False
+    if context.user_data['is_first_run']:
+        context.user_data['is_first_run'] = False
         welcome_message = get_text(user_id, 'welcome_first')
     else:
         welcome_message = get_text(user_id, 'welcome_back')
-    keyboard = [
-        [get_text(user_id, 'record_time'), get_text(user_id, 'report')],
-        [get_text(user_id, 'settings')],
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'main')
     await update.message.reply_text(welcome_message, reply_markup=reply_markup)
     return MAIN_MENU
 
 async def time_recording_menu(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    keyboard = [
-        [get_text(user_id, 'record_arrival'), get_text(user_id, 'record_departure')],
-        [get_text(user_id, 'back')]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'time_recording')
     await update.message.reply_text(get_text(user_id, 'choose_action'), reply_markup=reply_markup)
     return TIME_RECORDING
 
-async def send_shift_end_reminder(context: CallbackContext, user_id: int, shift_end: datetime):
+async def send_shift_end_reminder(bot, user_id: int, shift_end: float):
     """Надсилає нагадування про кінець зміни"""
     try:
-        reminder_text = get_text(user_id, 'shift_end_reminder').format(shift_end.strftime('%H:%M'))
-        await context.bot.send_message(
+        await load_user_settings(user_id)
+        shift_end_local = datetime.fromtimestamp(shift_end, get_zone(get_user_timezone(user_id)))
+        reminder_text = get_text(user_id, 'shift_end_reminder').format(shift_end_local.strftime('%H:%M'))
+        await bot.send_message(
             chat_id=user_id,
-            text=reminder_text
+            text=reminder_text,
+            rate_limit_args=PRIORITY_REMINDER
         )
     except Exception as e:
         logger.error(f"Не вдалося відправити нагадування користувачу {user_id}: {e}")
-        if user_id in scheduled_reminders:
-            scheduled_reminders[user_id].cancel()
-            del scheduled_reminders[user_id]
+
+async def send_forgotten_shift_notice(bot, user_id: int, records: list):
+    """Сповіщає користувача одним повідомленням про зміни, які закрив або позначив прибиральник"""
+    rendered_reports.bump(user_id)
+    await load_user_settings(user_id)
+    notices = []
+    for record in records:
+        if record.end_at is not None:
+            notices.append(get_text(user_id, 'shift_auto_closed').format(
+                record.date, record.arrival_time, record.departure_time))
+        else:
+            notices.append(get_text(user_id, 'shift_left_open').format(record.date, record.arrival_time))
+    await bot.send_message(chat_id=user_id, text="\n\n".join(notices), rate_limit_args=PRIORITY_REMINDER)
 
 def calculate_shift_end(arrival_time: datetime) -> datetime:
     """Розраховує очікуваний час закінчення зміни"""
-    shift_duration = timedelta(hours=8)
-    return arrival_time + shift_duration
+    return arrival_time + SHIFT_DURATION
 
 async def schedule_shift_end_reminder(context: CallbackContext, user_id: int, arrival_time: datetime):
     """Планує нагадування про кінець зміни"""
@@ -617,14 +725,7 @@ async def schedule_shift_end_reminder(context: CallbackContext, user_id: int, ar
     now = get_local_time(user_id)
     delay = (reminder_time - now).total_seconds()
     if delay > 0:
-        async def delayed_reminder():
-            try:
-                await asyncio.sleep(delay)
-                await send_shift_end_reminder(context, user_id, shift_end)
-            except Exception as e:
-                logger.error(f"Не вдалося запланувати нагадування для користувача {user_id}: {e}")
-        task = asyncio.create_task(delayed_reminder())
-        scheduled_reminders[user_id] = task
+        await reminders.schedule(user_id, reminder_time.timestamp(), shift_end.timestamp())
         logger.info(f"Нагадування для користувача {user_id} заплановано на {reminder_time}")
     else:
         logger.warning(f"Час для нагадування користувачу {user_id} вже минув.")
@@ -633,270 +734,287 @@ async def record_arrival(update: Update, context: CallbackContext) -> int:
     user_id = update.message.from_user.id
     current_time = get_local_time(user_id)
     current_date = current_time.date()
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('SELECT arrival_time FROM time_records WHERE date = ? AND user_id = ?',
-              (current_date.isoformat(), user_id))
-    existing_record = c.fetchone()
-    if existing_record:
+    open_shift = await db.get_open_shift(user_id, int((current_time - OPEN_SHIFT_WINDOW).timestamp()))
+    if open_shift:
         await update.message.reply_text(get_text(user_id, 'already_recorded_arrival'))
     else:
-        c.execute('''INSERT INTO time_records (date, user_id, arrival_time)
-                     VALUES (?, ?, ?)''',
-                  (current_date.isoformat(), user_id, current_time.strftime('%H:%M:%S')))
-        conn.commit()
+        await db.insert_arrival(user_id, current_date.isoformat(), int(current_time.timestamp()),
+                                get_user_timezone(user_id))
+        rendered_reports.bump(user_id)
         shift_end = calculate_shift_end(current_time)
         await update.message.reply_text(
             f'{get_text(user_id, "arrival_recorded")} {current_time.strftime("%H:%M:%S")}\n'
             f'{get_text(user_id, "expected_shift_end")} {shift_end.strftime("%H:%M:%S")}'
         )
         await schedule_shift_end_reminder(context, user_id, current_time)
-    conn.close()
     return TIME_RECORDING
 
 async def record_departure(update: Update, context: CallbackContext) -> int:
     user_id = update.message.from_user.id
-    if user_id in scheduled_reminders:
-        scheduled_reminders[user_id].cancel()
-        del scheduled_reminders[user_id]
+    await reminders.cancel(user_id)
     current_time = get_local_time(user_id)
-    current_date = current_time.date().isoformat()
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('''SELECT arrival_time, departure_time FROM time_records 
-                 WHERE date = ? AND user_id = ?''', (current_date, user_id))
-    record = c.fetchone()
-    if not record:
-        yesterday = (current_time - timedelta(days=1)).date().isoformat()
-        c.execute('''SELECT arrival_time, departure_time FROM time_records 
-                     WHERE date = ? AND user_id = ? AND departure_time IS NULL''',
-                  (yesterday, user_id))
-        yesterday_record = c.fetchone()
-        if yesterday_record:
-            c.execute('''UPDATE time_records 
-                         SET departure_time = ? 
-                         WHERE date = ? AND user_id = ?''',
-                      (current_time.strftime('%H:%M:%S'), yesterday, user_id))
-            conn.commit()
-            await update.message.reply_text(
-                f'{get_text(user_id, "departure_recorded")} {current_time.strftime("%Y-%m-%d %H:%M:%S")}'
-            )
-        else:
-            await update.message.reply_text(get_text(user_id, 'record_arrival_first'))
-    elif record[1]:
-        await update.message.reply_text(get_text(user_id, 'already_recorded_departure'))
+    open_shift = await db.get_open_shift(user_id, int((current_time - OPEN_SHIFT_WINDOW).timestamp()))
+    if not open_shift:
+        await update.message.reply_text(get_text(user_id, 'record_arrival_first'))
     else:
-        c.execute('''UPDATE time_records 
-                     SET departure_time = ? 
-                     WHERE date = ? AND user_id = ?''',
-                  (current_time.strftime('%H:%M:%S'), current_date, user_id))
-        conn.commit()
+        await db.set_departure(user_id, open_shift.id, int(current_time.timestamp()))
+        rendered_reports.bump(user_id)
         await update.message.reply_text(
             f'{get_text(user_id, "departure_recorded")} {current_time.strftime("%Y-%m-%d %H:%M:%S")}'
         )
-    conn.close()
     return TIME_RECORDING
 
 async def report_menu(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    keyboard = [
-        [get_text(user_id, 'daily_report'), get_text(user_id, 'monthly_report')],
-        [get_text(user_id, 'edit_report'), get_text(user_id, 'back')]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'report')
     await update.message.reply_text(get_text(user_id, 'choose_report_type'), reply_markup=reply_markup)
     return REPORT_MENU
 
+async def cached_report(user_id: int, kind: str, period: str, build):
+    """Текст звіту kind за period мовою користувача з кешу або з build() — корутини, що його рендерить.
+
+    Звіт None (немає записів) не кешується.
+    """
+    key = (kind, period, get_user_language(user_id))
+    report = rendered_reports.get(user_id, key)
+    if report is None:
+        version = rendered_reports.version(user_id)
+        report = await build()
+        if report is not None:
+            rendered_reports.put(user_id, version, key, report)
+    return report
+
+async def build_daily_report(user_id: int, current_date) -> str:
+    """Сформувати текст звіту за день current_date разом з нічною зміною від учора"""
+    hourly_rate = get_user_rate(user_id)
+    yesterday = (current_date - timedelta(days=1)).isoformat()
+    current_date_str = current_date.isoformat()
+    records = await db.get_records_for_dates(user_id, [current_date_str, yesterday])
+    if not records:
+        return get_text(user_id, 'no_records_today')
+    report = get_text(user_id, 'daily_report_title').format(current_date.strftime('%d %B %Y')) + "\n"
+    closed = [record for record in records if record.end_at is not None]
+    total_hours = sum(record.hours for record in closed)
+    for record in closed:
+        if record.date == yesterday:
+            report += f"{get_text(user_id, 'night_shift')}\n"
+            report += f"{get_text(user_id, 'arrival')} {record.arrival_time} ({get_text(user_id, 'yesterday')})\n"
+            report += f"{get_text(user_id, 'departure')} {record.departure_time}\n"
+            report += f"{get_text(user_id, 'worked_shift')} {record.hours:.2f} {get_text(user_id, 'hours')}\n"
+    today_shifts = [record for record in closed if record.date == current_date_str]
+    if today_shifts:
+        report += describe_shifts(user_id, today_shifts, 'worked_today') + "\n"
+    if hourly_rate:
+        earnings = total_hours * hourly_rate
+        report += f"\n{get_text(user_id, 'earnings')} {earnings:.2f} PLN"
+    return report
+
 async def daily_report(update: Update, context: CallbackContext) -> int:
     user_id = update.message.from_user.id
     current_date = get_local_time(user_id).date()
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('SELECT rate FROM hourly_rates WHERE user_id = ?', (user_id,))
-    rate_record = c.fetchone()
-    hourly_rate = rate_record[0] if rate_record else None
-    yesterday = (current_date - timedelta(days=1)).isoformat()
-    current_date_str = current_date.isoformat()
-    c.execute('''SELECT date, arrival_time, departure_time FROM time_records 
-                 WHERE (date = ? OR date = ?) AND user_id = ?''',
-              (current_date_str, yesterday, user_id))
-    records = c.fetchall()
-    if records:
-        report = get_text(user_id, 'daily_report_title').format(current_date.strftime('%d %B %Y')) + "\n"
-        total_hours = 0
-        today_hours = 0
-        yesterday_hours = 0
-        for record in records:
-            date, arrival_time, departure_time = record
-            if arrival_time and departure_time:
-                arrival_dt = datetime.strptime(f"{date} {arrival_time}", '%Y-%m-%d %H:%M:%S')
-                departure_dt = datetime.strptime(f"{date} {departure_time}", '%Y-%m-%d %H:%M:%S')
-                arrival_dt = pytz.timezone(get_user_timezone(user_id)).localize(arrival_dt)
-                departure_dt = pytz.timezone(get_user_timezone(user_id)).localize(departure_dt)
-                if departure_dt < arrival_dt:
-                    departure_dt += timedelta(days=1)
-                time_diff = departure_dt - arrival_dt
-                hours = time_diff.total_seconds() / 3600
-                total_hours += hours
-                if date == current_date_str:
-                    today_hours += hours
-                    report += f"{get_text(user_id, 'arrival')} {arrival_time}\n"
-                    report += f"{get_text(user_id, 'departure')} {departure_time}\n"
-                    report += f"{get_text(user_id, 'worked_today')} {hours:.2f} {get_text(user_id, 'hours')}\n"
-                elif date == yesterday:
-                    yesterday_hours += hours
-                    report += f"{get_text(user_id, 'night_shift')}\n"
-                    report += f"{get_text(user_id, 'arrival')} {arrival_time} ({get_text(user_id, 'yesterday')})\n"
-                    report += f"{get_text(user_id, 'departure')} {departure_time}\n"
-                    report += f"{get_text(user_id, 'worked_shift')} {hours:.2f} {get_text(user_id, 'hours')}\n"
-        if hourly_rate:
-            earnings = total_hours * hourly_rate
-            report += f"\n{get_text(user_id, 'earnings')} {earnings:.2f} PLN"
-    else:
-        report = get_text(user_id, 'no_records_today')
-    conn.close()
+    report = await cached_report(user_id, 'daily', current_date.isoformat(),
+                                 lambda: build_daily_report(user_id, current_date))
     await update.message.reply_text(report)
     return REPORT_MENU
 
+async def build_month_report(user_id: int, month: str, title: str) -> str:
+    """Сформувати текст звіту за місяць РРРР-ММ або None, якщо записів немає"""
+    totals = await month_totals(db, user_id, month)
+    if not totals.has_records:
+        return None
+    report = get_text(user_id, 'monthly_report_title').format(title) + "\n\n"
+    for date, hours in totals.days:
+        report += f"{date}: {hours:.2f} {get_text(user_id, 'hours')}\n"
+    report += f"\n{get_text(user_id, 'worked_month')} {totals.total_hours:.2f} {get_text(user_id, 'hours')}"
+    hourly_rate = get_user_rate(user_id)
+    if hourly_rate:
+        monthly_earnings = totals.total_hours * hourly_rate
+        report += f"\n{get_text(user_id, 'earnings_month')} {monthly_earnings:.2f} PLN"
+    return report
+
 async def monthly_report(update: Update, context: CallbackContext) -> int:
     user_id = update.message.from_user.id
     current_date = get_local_time(user_id)
-    current_month = current_date.strftime('%Y-%m')
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('SELECT rate FROM hourly_rates WHERE user_id = ?', (user_id,))
-    rate_record = c.fetchone()
-    hourly_rate = rate_record[0] if rate_record else None
-    c.execute('''SELECT date, arrival_time, departure_time FROM time_records 
-                 WHERE date LIKE ? AND user_id = ?
-                 ORDER BY date''', (f"{current_month}%", user_id))
-    records = c.fetchall()
-    if records:
-        report = get_text(user_id, 'monthly_report_title').format(current_date.strftime('%B')) + "\n\n"
-        monthly_total = 0
-        current_day = None
-        day_hours = 0
-        for record in records:
-            date, arrival, departure = record
-            if arrival and departure:
-                arrival_dt = datetime.strptime(f"{date} {arrival}", '%Y-%m-%d %H:%M:%S')
-                departure_dt = datetime.strptime(f"{date} {departure}", '%Y-%m-%d %H:%M:%S')
-                arrival_dt = pytz.timezone(get_user_timezone(user_id)).localize(arrival_dt)
-                departure_dt = pytz.timezone(get_user_timezone(user_id)).localize(departure_dt)
-                if departure_dt < arrival_dt:
-                    departure_dt += timedelta(days=1)
-                time_diff = departure_dt - arrival_dt
-                hours = time_diff.total_seconds() / 3600
-                if date != current_day:
-                    if current_day:
-                        report += f"{current_day}: {day_hours:.2f} {get_text(user_id, 'hours')}\n"
-                    current_day = date
-                    day_hours = hours
-                else:
-                    day_hours += hours
-                monthly_total += hours
-        if current_day:
-            report += f"{current_day}: {day_hours:.2f} {get_text(user_id, 'hours')}\n"
-        report += f"\n{get_text(user_id, 'worked_month')} {monthly_total:.2f} {get_text(user_id, 'hours')}"
-        if hourly_rate:
-            monthly_earnings = monthly_total * hourly_rate
-            report += f"\n{get_text(user_id, 'earnings_month')} {monthly_earnings:.2f} PLN"
-    else:
+    month = current_date.strftime('%Y-%m')
+    report = await cached_report(user_id, 'monthly', month,
+                                 lambda: build_month_report(user_id, month, current_date.strftime('%B')))
+    if report is None:
         report = get_text(user_id, 'no_records_month')
-    conn.close()
     await update.message.reply_text(report)
     return REPORT_MENU
 
+# Інлайн-списки зі сторінками; літера екрана — перший символ callback_data кнопок списку
+EDIT_LIST = 'e'
+DELETE_LIST = 'd'
+MONTH_LIST = 'm'
+DAY_LIST = 't'
+
+def shift_label(shift) -> str:
+    """Підпис зміни: дата, прихід і відхід (… для незакритої)"""
+    departure = shift.departure_time[:5] if shift.end_at is not None else '…'
+    return f"{shift.date} {shift.arrival_time[:5]}–{departure}"
+
+def shift_button(shift) -> tuple:
+    return shift_label(shift), shift.id, f"{shift.date}.{shift.start_at}.{shift.id}"
+
+def month_button(month: str) -> tuple:
+    return datetime.strptime(month, '%Y-%m').strftime('%B %Y'), month, month
+
+def day_button(date: str) -> tuple:
+    return datetime.strptime(date, '%Y-%m-%d').strftime('%d %B %Y'), date, date
+
+def list_source(user_id: int, screen: str, cursor: str = None, month: str = None) -> tuple:
+    """(keyset-запит сторінки, ключ курсора, кнопка рядка) для інлайн-списку screen"""
+    if screen == MONTH_LIST:
+        return partial(db.get_month_page, user_id), (cursor,) if cursor else None, month_button
+    if screen == DAY_LIST:
+        return partial(db.get_date_page, user_id, month or cursor[:7]), (cursor,) if cursor else None, day_button
+    key = None
+    if cursor:
+        parts = cursor.split('.')
+        # Курсор без id (кнопки, надіслані до його появи) веде на першу сторінку
+        if len(parts) == 3:
+            key = (parts[0], int(parts[1]), int(parts[2]))
+    return partial(db.get_shift_page, user_id), key, shift_button
+
+async def list_markup(user_id: int, screen: str, cursor: str = None, older: bool = True, month: str = None):
+    """Інлайн-клавіатура сторінки списку screen або None, якщо список порожній"""
+    fetch, key, button = list_source(user_id, screen, cursor, month)
+    page = await load_page(fetch, key, older, config.LIST_PAGE_SIZE)
+    if not page.rows:
+        return None
+    extra = ()
+    if screen == DAY_LIST:
+        # Повернення до місяців — перша сторінка списку місяців
+        extra = ([InlineKeyboardButton(get_text(user_id, 'back_to_month_selection'),
+                                       callback_data=f"{MONTH_LIST}{NEWER}")],)
+    return page_markup(screen, page, button, extra)
+
+async def send_list(update: Update, user_id: int, screen: str) -> None:
+    """Надіслати першу сторінку інлайн-списку screen; порожній список не надсилається"""
+    reply_markup = await list_markup(user_id, screen)
+    if reply_markup is not None:
+        await update.effective_message.reply_text(get_text(user_id, 'choose_from_list'), reply_markup=reply_markup)
+
+async def find_shift(user_id: int, label: str):
+    """Зміна за введеним підписом «дата» або «дата #n» (n-та зміна дня) або None"""
+    date, _, number = label.partition(' #')
+    if number and not number.isdigit():
+        return None
+    index = int(number) - 1 if number else 0
+    shifts = await db.get_shifts(user_id, date)
+    return shifts[index] if 0 <= index < len(shifts) else None
+
+def describe_shifts(user_id: int, shifts: list, worked_text: str) -> str:
+    """Прихід і відхід кожної зміни дня та відпрацьований час закритих змін"""
+    lines = []
+    for shift in shifts:
+        departure = shift.departure_time if shift.end_at is not None else get_text(user_id, 'not_recorded_yet')
+        lines.append(f"{get_text(user_id, 'arrival')} {shift.arrival_time}")
+        lines.append(f"{get_text(user_id, 'departure')} {departure}")
+    closed = [shift.hours for shift in shifts if shift.end_at is not None]
+    if closed:
+        lines.append(f"{get_text(user_id, worked_text)} {sum(closed):.2f} {get_text(user_id, 'hours')}")
+    return "\n".join(lines)
+
 async def edit_report_menu(update: Update, context: CallbackContext) -> int:
     user_id = update.message.from_user.id
-    current_date = get_local_time(user_id)
-    current_month = current_date.strftime('%Y-%m')
     # Скидаємо дію, щоб уникнути автоматичного видалення
     context.user_data['action'] = None
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('''SELECT date FROM time_records 
-                 WHERE date LIKE ? AND user_id = ?
-                 ORDER BY date DESC''', (f"{current_month}%", user_id))
-    records = c.fetchall()
-    keyboard = [
-        [get_text(user_id, 'back')],
-        [get_text(user_id, 'new_record'), get_text(user_id, 'delete_record')]
-    ]
-    if records:
-        keyboard.extend([[date[0]] for date in records])
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'edit_dates')
     await update.message.reply_text(
         get_text(user_id, 'choose_date_or_action'),
         reply_markup=reply_markup
     )
-    conn.close()
+    await send_list(update, user_id, EDIT_LIST)
     return WAITING_FOR_DATE
 
+async def open_shift_editor(update: Update, context: CallbackContext, shift) -> int:
+    user_id = update.effective_user.id
+    context.user_data['edit_date'] = shift.date
+    context.user_data['edit_shift_id'] = shift.id
+    reply_markup = get_keyboard(user_id, 'edit_time')
+    await update.effective_message.reply_text(
+        get_text(user_id, 'edit_what').format(shift_label(shift)),
+        reply_markup=reply_markup
+    )
+    return EDIT_TIME
+
+async def confirm_delete(update: Update, context: CallbackContext, shift) -> int:
+    user_id = update.effective_user.id
+    keyboard = [
+        [InlineKeyboardButton(get_text(user_id, 'yes'), callback_data=f"delete_yes_{shift.id}"),
+         InlineKeyboardButton(get_text(user_id, 'no'), callback_data="delete_no")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.effective_message.reply_text(
+        get_text(user_id, 'confirm_delete').format(shift_label(shift)),
+        reply_markup=reply_markup
+    )
+    return DELETE_CONFIRM
+
 async def handle_date_selection(update: Update, context: CallbackContext) -> int:
     user_id = update.message.from_user.id
     selected_option = update.message.text
     
     # Перевірка на "Назад" у всіх мовах
-    if selected_option in [get_text(user_id, 'back'), '↩️ Назад', '↩️ Back', '↩️ Wstecz']:
+    action = catalog.action(selected_option)
+    if action == 'back':
         return await report_menu(update, context)
     # Перевірка на "Новий запис" у всіх мовах
-    elif selected_option in [get_text(user_id, 'new_record'), '📝 Новий запис', '📝 New record', '📝 Nowy zapis']:
+    elif action == 'new_record':
         current_date = get_local_time(user_id).date().isoformat()
-        keyboard = [
-            [get_text(user_id, 'today_date')],
-            [get_text(user_id, 'enter_manually')],
-            [get_text(user_id, 'back')]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        reply_markup = get_keyboard(user_id, 'new_record')
         await update.message.reply_text(
             get_text(user_id, 'creating_new_record').format(current_date),
             reply_markup=reply_markup
         )
         return WAITING_FOR_NEW_DATE
     # Перевірка на "Видалити запис" у всіх мовах
-    elif selected_option in [get_text(user_id, 'delete_record'), '🗑️ Видалити запис', '🗑️ Delete record', '🗑️ Usuń zapis']:
-        keyboard = [[get_text(user_id, 'back')]]
-        current_month = get_local_time(user_id).strftime('%Y-%m')
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
-        c.execute('''SELECT date FROM time_records 
-                     WHERE date LIKE ? AND user_id = ?
-                     ORDER BY date DESC''', (f"{current_month}%", user_id))
-        records = c.fetchall()
-        if records:
-            keyboard.extend([[date[0]] for date in records])
-        conn.close()
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    elif action == 'delete_record':
+        reply_markup = get_keyboard(user_id, 'delete_dates')
         await update.message.reply_text(
             get_text(user_id, 'choose_date_to_delete'),
             reply_markup=reply_markup
         )
+        await send_list(update, user_id, DELETE_LIST)
         context.user_data['action'] = 'delete'
         return WAITING_FOR_DATE
+    # Дату можна ввести й вручну замість вибору в списку
+    shift = await find_shift(user_id, selected_option)
+    if shift is None:
+        await update.message.reply_text(get_text(user_id, 'no_day_records'))
+        return WAITING_FOR_DATE
     if context.user_data.get('action') == 'delete':
-        context.user_data['delete_date'] = selected_option
-        keyboard = [
-            [InlineKeyboardButton(get_text(user_id, 'yes'), callback_data=f"delete_yes_{selected_option}"),
-             InlineKeyboardButton(get_text(user_id, 'no'), callback_data="delete_no")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            get_text(user_id, 'confirm_delete').format(selected_option),
-            reply_markup=reply_markup
-        )
-        return DELETE_CONFIRM
-    context.user_data['edit_date'] = selected_option
-    keyboard = [
-        [get_text(user_id, 'arrival_time'), get_text(user_id, 'departure_time')],
-        [get_text(user_id, 'back')]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-    await update.message.reply_text(
-        get_text(user_id, 'edit_what').format(selected_option),
-        reply_markup=reply_markup
-    )
-    return EDIT_TIME
+        return await confirm_delete(update, context, shift)
+    return await open_shift_editor(update, context, shift)
+
+async def handle_list_page(update: Update, context: CallbackContext):
+    """Гортання інлайн-списку або вибір його рядка; гортання не змінює стан розмови"""
+    query = update.callback_query
+    await query.answer()
+    user_id = update.effective_user.id
+    screen, action, value = parse_callback(query.data)
+    if action != SELECT:
+        reply_markup = await list_markup(user_id, screen, value, action == OLDER)
+        if screen == MONTH_LIST:
+            # Список місяців замінює звіт, показаний у цьому ж повідомленні
+            text = get_text(user_id, 'choose_from_list' if reply_markup else 'no_records_month')
+            await query.edit_message_text(text, reply_markup=reply_markup)
+        else:
+            await query.edit_message_reply_markup(reply_markup)
+        return None
+    if screen == MONTH_LIST:
+        return await show_month_report(update, context, value)
+    if screen == DAY_LIST:
+        return await show_day_report(update, context, value)
+    shift = await db.get_shift(user_id, int(value))
+    if shift is None:
+        await query.message.reply_text(get_text(user_id, 'no_day_records'))
+        return None
+    if screen == DELETE_LIST:
+        return await confirm_delete(update, context, shift)
+    return await open_shift_editor(update, context, shift)
 
 async def handle_delete_confirmation(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
@@ -904,22 +1022,17 @@ async def handle_delete_confirmation(update: Update, context: CallbackContext) -
     user_id = update.effective_user.id
     
     if query.data.startswith("delete_yes_"):
-        date_to_delete = query.data.replace("delete_yes_", "")
+        shift_id = query.data.replace("delete_yes_", "")
         try:
-            conn = sqlite3.connect('timekeeper.db')
-            c = conn.cursor()
-            c.execute('PRAGMA busy_timeout = 10000')
-            c.execute('DELETE FROM time_records WHERE date = ? AND user_id = ?',
-                      (date_to_delete, user_id))
-            conn.commit()
-            await query.edit_message_text(get_text(user_id, 'record_deleted').format(date_to_delete))
-            conn.close()
+            shift = await db.get_shift(user_id, int(shift_id)) if shift_id.isdigit() else None
+            if shift:
+                await db.delete_record(user_id, shift.id)
+                rendered_reports.bump(user_id)
+                await query.edit_message_text(get_text(user_id, 'record_deleted').format(shift_label(shift)))
+            else:
+                await query.edit_message_text(get_text(user_id, 'no_day_records'))
             # Повертаємо в головне меню
-            keyboard = [
-                [get_text(user_id, 'record_time'), get_text(user_id, 'report')],
-                [get_text(user_id, 'settings')],
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+            reply_markup = get_keyboard(user_id, 'main')
             await context.bot.send_message(
                 chat_id=user_id,
                 text=get_text(user_id, 'welcome_back'),
@@ -932,11 +1045,7 @@ async def handle_delete_confirmation(update: Update, context: CallbackContext) -
     else:  # delete_no
         await query.edit_message_text(get_text(user_id, 'delete_cancelled'))
         # Повертаємо в меню редагування
-        keyboard = [
-            [get_text(user_id, 'daily_report'), get_text(user_id, 'monthly_report')],
-            [get_text(user_id, 'edit_report'), get_text(user_id, 'back')]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        reply_markup = get_keyboard(user_id, 'report')
         await context.bot.send_message(
             chat_id=user_id,
             text=get_text(user_id, 'choose_report_type'),
@@ -949,17 +1058,14 @@ async def handle_time_edit(update: Update, context: CallbackContext) -> int:
     choice = update.message.text
     
     # Перевірка на "Назад" у всіх мовах
-    if choice in [get_text(user_id, 'back'), '↩️ Назад', '↩️ Back', '↩️ Wstecz']:
+    action = catalog.action(choice)
+    if action == 'back':
         return await edit_report_menu(update, context)
     
-    # Визначаємо тип за емодзі або текстом
-    if '🟢' in choice or 'arrival' in choice.lower() or 'приход' in choice.lower() or 'przyjś' in choice.lower():
-        context.user_data['edit_type'] = 'arrival_time'
-    else:
-        context.user_data['edit_type'] = 'departure_time'
+    # Кнопка будь-якою мовою; усе, що не прихід, редагує відхід
+    context.user_data['edit_type'] = 'arrival_time' if action == 'arrival_time' else 'departure_time'
     
-    keyboard = [[get_text(user_id, 'cancel')]]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'cancel')
     await update.message.reply_text(
         get_text(user_id, 'enter_new_time'),
         reply_markup=reply_markup
@@ -973,19 +1079,13 @@ async def save_edited_time(update: Update, context: CallbackContext) -> int:
     current_date = get_local_time(user_id).date().isoformat()
     
     # Перевірка на скасування у всіх мовах
-    if new_time in [get_text(user_id, 'cancel'), '❌ Скасувати', '❌ Cancel', '❌ Anuluj']:
+    if catalog.action(new_time) == 'cancel':
         return await report_menu(update, context)
     
     try:
         parsed_time = parse_time_input(new_time)
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
-        c.execute(f'''UPDATE time_records 
-                     SET {context.user_data['edit_type']} = ?
-                     WHERE date = ? AND user_id = ?''',
-                  (parsed_time, edit_date, user_id))
-        conn.commit()
-        conn.close()
+        await db.update_time(user_id, context.user_data['edit_shift_id'], context.user_data['edit_type'], parsed_time)
+        rendered_reports.bump(user_id)
         if edit_date == current_date:
             await update.message.reply_text(get_text(user_id, 'time_updated'))
         else:
@@ -1000,15 +1100,15 @@ async def handle_new_date(update: Update, context: CallbackContext) -> int:
     selected_option = update.message.text
     
     # Перевірка на "Назад" або "Скасувати" у всіх мовах
-    if selected_option in [get_text(user_id, 'back'), get_text(user_id, 'cancel'), '↩️ Назад', '❌ Скасувати', '↩️ Back', '❌ Cancel', '↩️ Wstecz', '❌ Anuluj']:
+    action = catalog.action(selected_option)
+    if action in ('back', 'cancel'):
         return await edit_report_menu(update, context)
     # Перевірка на "Сьогоднішня дата" у всіх мовах
-    elif selected_option in [get_text(user_id, 'today_date'), '📅 Сьогоднішня дата', '📅 Today\'s date', '📅 Dzisiejsza data']:
+    elif action == 'today_date':
         new_date = get_local_time(user_id).date().isoformat()
     # Перевірка на "Ввести вручну" у всіх мовах
-    elif selected_option in [get_text(user_id, 'enter_manually'), '✍️ Ввести вручну', '✍️ Enter manually', '✍️ Wprowadź ręcznie']:
-        keyboard = [[get_text(user_id, 'cancel')]]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    elif action == 'enter_manually':
+        reply_markup = get_keyboard(user_id, 'cancel')
         await update.message.reply_text(
             get_text(user_id, 'enter_date_format'),
             reply_markup=reply_markup
@@ -1021,19 +1121,8 @@ async def handle_new_date(update: Update, context: CallbackContext) -> int:
         if input_date.date() > get_local_time(user_id).date():
             await update.message.reply_text(get_text(user_id, 'no_future_dates'))
             return await edit_report_menu(update, context)
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
-        c.execute('''SELECT arrival_time FROM time_records 
-                    WHERE date = ? AND user_id = ?''',
-                  (new_date, user_id))
-        existing_record = c.fetchone()
-        conn.close()
-        if existing_record:
-            await update.message.reply_text(get_text(user_id, 'record_exists'))
-            return await edit_report_menu(update, context)
         context.user_data['new_date'] = new_date
-        keyboard = [[get_text(user_id, 'cancel')]]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        reply_markup = get_keyboard(user_id, 'cancel')
         await update.message.reply_text(
             get_text(user_id, 'enter_arrival_time'),
             reply_markup=reply_markup
@@ -1042,13 +1131,7 @@ async def handle_new_date(update: Update, context: CallbackContext) -> int:
         return SAVE_NEW_RECORD
     except ValueError:
         await update.message.reply_text(get_text(user_id, 'invalid_date_format'))
-        keyboard = [
-            [get_text(user_id, 'today_date')],
-            [get_text(user_id, 'enter_manually')],
-            [get_text(user_id, 'back')],
-            [get_text(user_id, 'cancel')]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        reply_markup = get_keyboard(user_id, 'new_record_retry')
         await update.message.reply_text(
             get_text(user_id, 'creating_new_record').format(get_local_time(user_id).date().isoformat()),
             reply_markup=reply_markup
@@ -1060,22 +1143,19 @@ async def save_new_record(update: Update, context: CallbackContext) -> int:
     new_time = update.message.text
     
     # Перевірка на "Назад" або "Скасувати" у всіх мовах
-    if new_time in [get_text(user_id, 'back'), get_text(user_id, 'cancel'), '↩️ Назад', '❌ Скасувати', '↩️ Back', '❌ Cancel', '↩️ Wstecz', '❌ Anuluj']:
+    if catalog.action(new_time) in ('back', 'cancel'):
         return await edit_report_menu(update, context)
     
     try:
         parsed_time = parse_time_input(new_time)
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
         
         if context.user_data['new_record_type'] == 'arrival_time':
-            c.execute('''INSERT INTO time_records (date, user_id, arrival_time)
-                        VALUES (?, ?, ?)''',
-                      (context.user_data['new_date'], user_id, parsed_time))
-            conn.commit()
-            conn.close()
-            keyboard = [[get_text(user_id, 'cancel')]]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+            timezone = get_user_timezone(user_id)
+            start_at = local_epoch(context.user_data['new_date'], parsed_time, timezone)
+            context.user_data['new_shift_id'] = await db.insert_arrival(
+                user_id, context.user_data['new_date'], start_at, timezone)
+            rendered_reports.bump(user_id)
+            reply_markup = get_keyboard(user_id, 'cancel')
             await update.message.reply_text(
                 get_text(user_id, 'arrival_time_saved'),
                 reply_markup=reply_markup
@@ -1083,108 +1163,60 @@ async def save_new_record(update: Update, context: CallbackContext) -> int:
             context.user_data['new_record_type'] = 'departure_time'
             return SAVE_NEW_RECORD
         elif context.user_data['new_record_type'] == 'departure_time':
-            c.execute('''UPDATE time_records 
-                        SET departure_time = ?
-                        WHERE date = ? AND user_id = ?''',
-                      (parsed_time, context.user_data['new_date'], user_id))
-            conn.commit()
-            conn.close()
+            await db.update_time(user_id, context.user_data['new_shift_id'], 'departure_time', parsed_time)
+            rendered_reports.bump(user_id)
             await update.message.reply_text(get_text(user_id, 'departure_time_saved'))
             return await report_menu(update, context)
     except ValueError:
         await update.message.reply_text(get_text(user_id, 'invalid_time_format'))
-        keyboard = [[get_text(user_id, 'cancel')]]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        reply_markup = get_keyboard(user_id, 'cancel')
         return SAVE_NEW_RECORD
 
 async def show_daily_stats(update: Update, context: CallbackContext) -> int:
     user_id = update.message.from_user.id
-    current_date = get_local_time(user_id).date()
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('''SELECT arrival_time, departure_time 
-                 FROM time_records 
-                 WHERE date = ? AND user_id = ?''',
-              (current_date.isoformat(), user_id))
-    record = c.fetchone()
-    if record:
-        arrival_time, departure_time = record
-        if arrival_time and departure_time:
-            arrival_dt = datetime.strptime(f"{current_date} {arrival_time}", '%Y-%m-%d %H:%M:%S')
-            departure_dt = datetime.strptime(f"{current_date} {departure_time}", '%Y-%m-%d %H:%M:%S')
-            arrival_dt = pytz.timezone(get_user_timezone(user_id)).localize(arrival_dt)
-            departure_dt = pytz.timezone(get_user_timezone(user_id)).localize(departure_dt)
-            if departure_dt < arrival_dt:
-                departure_dt += timedelta(days=1)
-            worked_time = departure_dt - arrival_dt
-            hours = worked_time.total_seconds() / 3600
-            stats = (
-                f"{get_text(user_id, 'stats_today')}\n\n"
-                f"{get_text(user_id, 'arrival')} {arrival_time}\n"
-                f"{get_text(user_id, 'departure')} {departure_time}\n"
-                f"{get_text(user_id, 'worked_today')} {hours:.2f} {get_text(user_id, 'hours')}"
-            )
-        else:
-            stats = (
-                f"{get_text(user_id, 'stats_today')}\n\n"
-                f"{get_text(user_id, 'arrival')} {arrival_time}\n"
-                f"{get_text(user_id, 'departure')} {get_text(user_id, 'not_recorded_yet')}"
-            )
+    current_time = get_local_time(user_id)
+    shifts = await db.get_shifts(user_id, current_time.date().isoformat())
+    if shifts:
+        stats = f"{get_text(user_id, 'stats_today')}\n\n" + describe_shifts(user_id, shifts, 'worked_today')
     else:
-        yesterday = (current_date - timedelta(days=1)).isoformat()
-        c.execute('''SELECT arrival_time 
-                    FROM time_records 
-                    WHERE date = ? AND user_id = ? AND departure_time IS NULL''',
-                  (yesterday, user_id))
-        yesterday_record = c.fetchone()
-        if yesterday_record:
+        open_shift = await db.get_open_shift(user_id, int((current_time - OPEN_SHIFT_WINDOW).timestamp()))
+        if open_shift:
+            day = open_shift.date
+            if day == (current_time.date() - timedelta(days=1)).isoformat():
+                day = get_text(user_id, 'yesterday')
             stats = (
                 f"{get_text(user_id, 'current_shift')}\n\n"
-                f"{get_text(user_id, 'arrival')} {yesterday_record[0]} ({get_text(user_id, 'yesterday')})\n"
+                f"{get_text(user_id, 'arrival')} {open_shift.arrival_time} ({day})\n"
                 f"{get_text(user_id, 'departure')} {get_text(user_id, 'not_recorded_yet')}"
             )
         else:
             stats = get_text(user_id, 'no_time_records')
-    conn.close()
-    keyboard = [
-        [get_text(user_id, 'record_time'), get_text(user_id, 'report')],
-        [get_text(user_id, 'settings')],
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'main')
     await update.message.reply_text(stats, reply_markup=reply_markup)
     return MAIN_MENU
 
 async def settings_menu(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    keyboard = [
-        [get_text(user_id, 'reset_time'), get_text(user_id, 'set_rate')],
-        [get_text(user_id, 'set_timezone'), get_text(user_id, 'set_language')],
-        [get_text(user_id, 'history')],
-        [get_text(user_id, 'back')]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'settings')
     await update.message.reply_text(get_text(user_id, 'settings_title'), reply_markup=reply_markup)
     return SETTINGS_MENU
 
 async def reset_time(update: Update, context: CallbackContext) -> int:
     user_id = update.message.from_user.id
     current_date = get_local_time(user_id).date().isoformat()
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('''DELETE FROM time_records 
-                 WHERE date = ? AND user_id = ?''', (current_date, user_id))
-    if c.rowcount > 0:
+    deleted = 0
+    for shift in await db.get_shifts(user_id, current_date):
+        deleted += await db.delete_record(user_id, shift.id)
+    if deleted > 0:
+        rendered_reports.bump(user_id)
         await update.message.reply_text(get_text(user_id, 'reset_today'))
     else:
         await update.message.reply_text(get_text(user_id, 'no_reset_records'))
-    conn.commit()
-    conn.close()
     return await start(update, context)
 
 async def set_hourly_rate(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    keyboard = [[get_text(user_id, 'cancel')]]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'cancel')
     await update.message.reply_text(get_text(user_id, 'enter_rate'), reply_markup=reply_markup)
     return WAITING_FOR_RATE
 
@@ -1192,19 +1224,16 @@ async def save_hourly_rate(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
     
     # Перевірка на скасування у всіх мовах
-    if update.message.text in [get_text(user_id, 'cancel'), '❌ Скасувати', '❌ Cancel', '❌ Anuluj']:
+    if catalog.action(update.message.text) == 'cancel':
         return await settings_menu(update, context)
     
     try:
         rate = float(update.message.text)
         if rate <= 0:
             raise ValueError(get_text(user_id, 'invalid_rate'))
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
-        c.execute('''INSERT OR REPLACE INTO hourly_rates (user_id, rate)
-                    VALUES (?, ?)''', (user_id, rate))
-        conn.commit()
-        conn.close()
+        await db.set_rate(user_id, rate)
+        rendered_reports.bump(user_id)
+        await refresh_user_settings(user_id)
         await update.message.reply_text(f'{get_text(user_id, "rate_set")} {rate} PLN')
         return await settings_menu(update, context)
     except ValueError:
@@ -1213,9 +1242,7 @@ async def save_hourly_rate(update: Update, context: CallbackContext) -> int:
 
 async def set_timezone(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    keyboard = [[tz] for tz in AVAILABLE_TIMEZONES]
-    keyboard.append([get_text(user_id, 'back')])
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'timezones')
     await update.message.reply_text(
         get_text(user_id, 'choose_timezone'),
         reply_markup=reply_markup
@@ -1225,29 +1252,19 @@ async def set_timezone(update: Update, context: CallbackContext) -> int:
 async def save_timezone(update: Update, context: CallbackContext) -> int:
     selected_timezone = update.message.text
     user_id = update.effective_user.id
-    if selected_timezone == get_text(user_id, 'back'):
+    if catalog.action(selected_timezone) == 'back':
         return await settings_menu(update, context)
     if selected_timezone not in AVAILABLE_TIMEZONES:
         await update.message.reply_text(get_text(user_id, 'invalid_timezone'))
         return SET_TIMEZONE
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('''INSERT OR REPLACE INTO user_timezones (user_id, timezone)
-                VALUES (?, ?)''', (user_id, selected_timezone))
-    conn.commit()
-    conn.close()
+    await db.set_timezone(user_id, selected_timezone)
+    await refresh_user_settings(user_id)
     await update.message.reply_text(f'{get_text(user_id, "timezone_set")} {selected_timezone}')
     return await settings_menu(update, context)
 
 async def set_language(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    keyboard = [
-        [get_text(user_id, 'ukrainian')],
-        [get_text(user_id, 'english')],
-        [get_text(user_id, 'polish')],
-        [get_text(user_id, 'back')]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'languages')
     await update.message.reply_text(
         get_text(user_id, 'choose_language'),
         reply_markup=reply_markup
@@ -1259,28 +1276,19 @@ async def save_language(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
     
     # Перевірка на "Назад" у всіх мовах
-    if selected_language in [get_text(user_id, 'back'), '↩️ Назад', '↩️ Back', '↩️ Wstecz']:
+    action = catalog.action(selected_language)
+    if action == 'back':
         return await settings_menu(update, context)
     
     # Визначаємо код мови
-    language_code = None
-    if selected_language in [LANGUAGES['uk']['ukrainian'], LANGUAGES['en']['ukrainian'], LANGUAGES['pl']['ukrainian']]:
-        language_code = 'uk'
-    elif selected_language in [LANGUAGES['uk']['english'], LANGUAGES['en']['english'], LANGUAGES['pl']['english']]:
-        language_code = 'en'
-    elif selected_language in [LANGUAGES['uk']['polish'], LANGUAGES['en']['polish'], LANGUAGES['pl']['polish']]:
-        language_code = 'pl'
+    language_code = LANGUAGE_ACTIONS.get(action)
     
     if not language_code:
         await update.message.reply_text(get_text(user_id, 'invalid_language'))
         return SET_LANGUAGE
     
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('''INSERT OR REPLACE INTO user_languages (user_id, language)
-                VALUES (?, ?)''', (user_id, language_code))
-    conn.commit()
-    conn.close()
+    await db.set_language(user_id, language_code)
+    await refresh_user_settings(user_id)
     
     # Відправляємо повідомлення новою мовою (тепер мова оновлена в БД)
     await update.message.reply_text(get_text(user_id, 'language_set'))
@@ -1288,239 +1296,102 @@ async def save_language(update: Update, context: CallbackContext) -> int:
 
 async def view_past_reports(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    conn = sqlite3.connect('timekeeper.db')
-    c = conn.cursor()
-    c.execute('''
-        SELECT DISTINCT substr(date, 1, 7) as month
-        FROM time_records
-        WHERE user_id = ?
-        ORDER BY month DESC
-    ''', (user_id,))
-    months = c.fetchall()
-    conn.close()
-    keyboard = [[get_text(user_id, 'back')]]
-    for month in months:
-        date_obj = datetime.strptime(month[0], '%Y-%m')
-        formatted_month = date_obj.strftime('%B %Y')
-        keyboard.append([formatted_month])
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = get_keyboard(user_id, 'months')
     await update.message.reply_text(get_text(user_id, 'choose_month'), reply_markup=reply_markup)
+    await send_list(update, user_id, MONTH_LIST)
     return SELECT_MONTH
 
-async def view_selected_month_report(update: Update, context: CallbackContext) -> int:
+async def handle_history_menu(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    selected_month = update.message.text
-    
-    # Перевірка на "Назад" у всіх мовах
-    if selected_month in [get_text(user_id, 'back'), '↩️ Назад', '↩️ Back', '↩️ Wstecz']:
+    # Перевірка на "Назад" у всіх мовах; місяць і день обираються лише кнопками списку
+    if catalog.action(update.message.text) == 'back':
         return await settings_menu(update, context)
-    try:
-        date_obj = datetime.strptime(selected_month, '%B %Y')
-        month_db_format = date_obj.strftime('%Y-%m')
-        context.user_data['selected_month'] = month_db_format
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
-        c.execute('SELECT rate FROM hourly_rates WHERE user_id = ?', (user_id,))
-        rate_record = c.fetchone()
-        hourly_rate = rate_record[0] if rate_record else None
-        c.execute('''
-            SELECT date, arrival_time, departure_time 
-            FROM time_records 
-            WHERE date LIKE ? AND user_id = ?
-            ORDER BY date
-        ''', (f"{month_db_format}%", user_id))
-        records = c.fetchall()
-        if records:
-            report = get_text(user_id, 'monthly_report_title').format(selected_month) + "\n\n"
-            monthly_total = 0
-            current_day = None
-            day_hours = 0
-            for record in records:
-                date, arrival, departure = record
-                if arrival and departure:
-                    arrival_dt = datetime.strptime(f"{date} {arrival}", '%Y-%m-%d %H:%M:%S')
-                    departure_dt = datetime.strptime(f"{date} {departure}", '%Y-%m-%d %H:%M:%S')
-                    arrival_dt = pytz.timezone(get_user_timezone(user_id)).localize(arrival_dt)
-                    departure_dt = pytz.timezone(get_user_timezone(user_id)).localize(departure_dt)
-                    if departure_dt < arrival_dt:
-                        departure_dt += timedelta(days=1)
-                    time_diff = departure_dt - arrival_dt
-                    hours = time_diff.total_seconds() / 3600
-                    if date != current_day:
-                        if current_day:
-                            report += f"{current_day}: {day_hours:.2f} {get_text(user_id, 'hours')}\n"
-                        current_day = date
-                        day_hours = hours
-                    else:
-                        day_hours += hours
-                    monthly_total += hours
-            if current_day:
-                report += f"{current_day}: {day_hours:.2f} {get_text(user_id, 'hours')}\n"
-            report += f"\n{get_text(user_id, 'worked_month')} {monthly_total:.2f} {get_text(user_id, 'hours')}"
-            if hourly_rate:
-                monthly_earnings = monthly_total * hourly_rate
-                report += f"\n{get_text(user_id, 'earnings_month')} {monthly_earnings:.2f} PLN"
-            keyboard = [
-                [get_text(user_id, 'select_specific_day')],
-                [get_text(user_id, 'back_to_month_selection')]
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            await update.message.reply_text(report, reply_markup=reply_markup)
-            return VIEW_SELECTED_REPORT
-        else:
-            await update.message.reply_text(get_text(user_id, 'no_records_month'))
-            return await view_past_reports(update, context)
-    except ValueError:
-        await update.message.reply_text(get_text(user_id, 'date_processing_error'))
-        return SELECT_MONTH
+    return await view_past_reports(update, context)
 
-async def handle_selected_report(update: Update, context: CallbackContext) -> int:
+async def show_month_report(update: Update, context: CallbackContext, month: str) -> None:
+    query = update.callback_query
     user_id = update.effective_user.id
-    choice = update.message.text
-    
-    # Перевірка на "Назад до вибору місяця" у всіх мовах
-    if choice in [get_text(user_id, 'back_to_month_selection'), '↩️ Назад до вибору місяця', '↩️ Back to month selection', '↩️ Powrót do wyboru miesiąca']:
-        return await view_past_reports(update, context)
-    # Перевірка на "Обрати конкретний день" у всіх мовах
-    elif choice in [get_text(user_id, 'select_specific_day'), '📅 Обрати конкретний день', '📅 Select specific day', '📅 Wybierz konkretny dzień']:
-        selected_month = context.user_data.get('selected_month')
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
-        c.execute('''
-            SELECT DISTINCT date
-            FROM time_records
-            WHERE date LIKE ? AND user_id = ?
-            ORDER BY date DESC
-        ''', (f"{selected_month}%", user_id))
-        days = c.fetchall()
-        conn.close()
-        keyboard = [[get_text(user_id, 'back_to_report')]]
-        for day in days:
-            date_obj = datetime.strptime(day[0], '%Y-%m-%d')
-            formatted_date = date_obj.strftime('%d %B %Y')
-            keyboard.append([formatted_date])
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await update.message.reply_text(get_text(user_id, 'choose_day_detail'), reply_markup=reply_markup)
-        return SELECT_DAY
-    return VIEW_SELECTED_REPORT
-
-async def view_selected_day_report(update: Update, context: CallbackContext) -> int:
+    report = await cached_report(
+        user_id, 'history', month,
+        lambda: build_month_report(user_id, month, datetime.strptime(month, '%Y-%m').strftime('%B %Y')))
+    if report is None:
+        reply_markup = await list_markup(user_id, MONTH_LIST)
+        await query.edit_message_text(get_text(user_id, 'no_records_month'), reply_markup=reply_markup)
+        return None
+    reply_markup = await list_markup(user_id, DAY_LIST, month=month)
+    await query.edit_message_text(f"{report}\n\n{get_text(user_id, 'choose_day_detail')}", reply_markup=reply_markup)
+    return None
+
+async def build_day_report(user_id: int, date: str) -> str:
+    """Сформувати детальний звіт за день РРРР-ММ-ДД або None, якщо записів немає"""
+    shifts = await db.get_shifts(user_id, date)
+    if not shifts:
+        return None
+    title = datetime.strptime(date, '%Y-%m-%d').strftime('%d %B %Y')
+    report = get_text(user_id, 'detailed_report_for').format(title) + "\n\n"
+    report += describe_shifts(user_id, shifts, 'worked')
+    hourly_rate = get_user_rate(user_id)
+    hours = sum(shift.hours for shift in shifts if shift.end_at is not None)
+    if hourly_rate and any(shift.end_at is not None for shift in shifts):
+        earnings = hours * hourly_rate
+        report += f"\n{get_text(user_id, 'earnings')} {earnings:.2f} PLN"
+    return report
+
+async def show_day_report(update: Update, context: CallbackContext, date: str) -> None:
+    query = update.callback_query
     user_id = update.effective_user.id
-    selected_day = update.message.text
-    
-    # Перевірка на "Назад до звіту" у всіх мовах
-    if selected_day in [get_text(user_id, 'back_to_report'), '↩️ Назад до звіту', '↩️ Back to report', '↩️ Powrót do raportu']:
-        month = context.user_data.get('selected_month')
-        if month:
-            keyboard = [
-                [get_text(user_id, 'select_specific_day')],
-                [get_text(user_id, 'back_to_month_selection')]
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            conn = sqlite3.connect('timekeeper.db')
-            c = conn.cursor()
-            c.execute('SELECT rate FROM hourly_rates WHERE user_id = ?', (user_id,))
-            rate_record = c.fetchone()
-            hourly_rate = rate_record[0] if rate_record else None
-            c.execute('''
-                SELECT date, arrival_time, departure_time 
-                FROM time_records 
-                WHERE date LIKE ? AND user_id = ?
-                ORDER BY date
-            ''', (f"{month}%", user_id))
-            records = c.fetchall()
-            if records:
-                date_obj = datetime.strptime(month, '%Y-%m')
-                formatted_month = date_obj.strftime('%B %Y')
-                report = get_text(user_id, 'monthly_report_title').format(formatted_month) + "\n\n"
-                monthly_total = 0
-                current_day = None
-                day_hours = 0
-                for record in records:
-                    date, arrival, departure = record
-                    if arrival and departure:
-                        arrival_dt = datetime.strptime(f"{date} {arrival}", '%Y-%m-%d %H:%M:%S')
-                        departure_dt = datetime.strptime(f"{date} {departure}", '%Y-%m-%d %H:%M:%S')
-                        arrival_dt = pytz.timezone(get_user_timezone(user_id)).localize(arrival_dt)
-                        departure_dt = pytz.timezone(get_user_timezone(user_id)).localize(departure_dt)
-                        if departure_dt < arrival_dt:
-                            departure_dt += timedelta(days=1)
-                        time_diff = departure_dt - arrival_dt
-                        hours = time_diff.total_seconds() / 3600
-                        if date != current_day:
-                            if current_day:
-                                report += f"{current_day}: {day_hours:.2f} {get_text(user_id, 'hours')}\n"
-                            current_day = date
-                            day_hours = hours
-                        else:
-                            day_hours += hours
-                        monthly_total += hours
-                if current_day:
-                    report += f"{current_day}: {day_hours:.2f} {get_text(user_id, 'hours')}\n"
-                report += f"\n{get_text(user_id, 'worked_month')} {monthly_total:.2f} {get_text(user_id, 'hours')}"
-                if hourly_rate:
-                    monthly_earnings = monthly_total * hourly_rate
-                    report += f"\n{get_text(user_id, 'earnings_month')} {monthly_earnings:.2f} PLN"
-                await update.message.reply_text(report, reply_markup=reply_markup)
-                conn.close()
-                return VIEW_SELECTED_REPORT
-            conn.close()
-        return await view_past_reports(update, context)
-    try:
-        date_obj = datetime.strptime(selected_day, '%d %B %Y')
-        date_db_format = date_obj.strftime('%Y-%m-%d')
-        conn = sqlite3.connect('timekeeper.db')
-        c = conn.cursor()
-        c.execute('SELECT rate FROM hourly_rates WHERE user_id = ?', (user_id,))
-        rate_record = c.fetchone()
-        hourly_rate = rate_record[0] if rate_record else None
-        c.execute('''
-            SELECT arrival_time, departure_time 
-            FROM time_records 
-            WHERE date = ? AND user_id = ?
-        ''', (date_db_format, user_id))
-        record = c.fetchone()
-        if record:
-            arrival_time, departure_time = record
-            report = get_text(user_id, 'detailed_report_for').format(selected_day) + "\n\n"
-            if arrival_time and departure_time:
-                arrival_dt = datetime.strptime(f"{date_db_format} {arrival_time}", '%Y-%m-%d %H:%M:%S')
-                departure_dt = datetime.strptime(f"{date_db_format} {departure_time}", '%Y-%m-%d %H:%M:%S')
-                arrival_dt = pytz.timezone(get_user_timezone(user_id)).localize(arrival_dt)
-                departure_dt = pytz.timezone(get_user_timezone(user_id)).localize(departure_dt)
-                if departure_dt < arrival_dt:
-                    departure_dt += timedelta(days=1)
-                worked_time = departure_dt - arrival_dt
-                hours = worked_time.total_seconds() / 3600
-                report += (
-                    f"{get_text(user_id, 'arrival')} {arrival_time}\n"
-                    f"{get_text(user_id, 'departure')} {departure_time}\n"
-                    f"{get_text(user_id, 'worked')} {hours:.2f} {get_text(user_id, 'hours')}"
-                )
-                if hourly_rate:
-                    earnings = hours * hourly_rate
-                    report += f"\n{get_text(user_id, 'earnings')} {earnings:.2f} PLN"
-            else:
-                report += (
-                    f"{get_text(user_id, 'arrival')} {arrival_time}\n"
-                    f"{get_text(user_id, 'departure')} {get_text(user_id, 'not_recorded_yet')}"
-                )
-            keyboard = [[get_text(user_id, 'back_to_report')]]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            await update.message.reply_text(report, reply_markup=reply_markup)
-        else:
-            await update.message.reply_text(get_text(user_id, 'no_day_records'))
-        conn.close()
-        return SELECT_DAY
-    except ValueError:
-        await update.message.reply_text(get_text(user_id, 'date_processing_error'))
-        return SELECT_DAY
+    report = await cached_report(user_id, 'day', date, lambda: build_day_report(user_id, date))
+    if report is None:
+        report = get_text(user_id, 'no_day_records')
+    # Звіт за місяць, до якого повертається кнопка, береться з кешу
+    keyboard = [[InlineKeyboardButton(get_text(user_id, 'back_to_report'),
+                                      callback_data=f"{MONTH_LIST}{SELECT}{date[:7]}")]]
+    await query.edit_message_text(report, reply_markup=InlineKeyboardMarkup(keyboard))
+    return None
 
-def main() -> None:
-    setup_database()
-    logging.getLogger('telegram.ext').setLevel(logging.WARNING)
-    application = Application.builder().token("7631269439:AAGPjfze-xKaMbQZtJNXiTUXxN3JN0E_LmI").build()
+async def post_init(application: Application) -> None:
+    await db.setup()
+    await reminders.start(application.bot, send_shift_end_reminder)
+    await user_profiles.start(application.bot, fetch_user_info)
+    await shift_sweeper.start(application.bot, send_forgotten_shift_notice)
+    if metrics_server:
+        await metrics_server.start()
+
+async def post_shutdown(application: Application) -> None:
+    if metrics_server:
+        await metrics_server.stop()
+    await reminders.stop()
+    await shift_sweeper.stop()
+    await user_profiles.stop()
+    await db.stop()
+    db.close()
+
+def build_application(request=None, rate_limiter=None,
+                      concurrent_updates: int = config.CONCURRENT_UPDATES) -> Application:
+    """Збирає застосунок з усіма обробниками.
+
+    request і rate_limiter дозволяють підмінити мережевий рівень Bot API
+    і обмежувач відправлення (наприклад, у бенчмарках).
+    """
+    update_processor = PerUserUpdateProcessor(concurrent_updates)
+    handler_metrics.add_gauge('users_pending', "Користувачів з оновленнями в обробці або в черзі",
+                              lambda: update_processor.pending_users)
+    builder = (
+        Application.builder()
+        .token("7631269439:AAGPjfze-xKaMbQZtJNXiTUXxN3JN0E_LmI")
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .rate_limiter(rate_limiter or outbox)
+        .persistence(persistence)
+        .concurrent_updates(update_processor)
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
+    application.add_handler(TypeHandler(Update, prepare_update), group=-1)
     application.add_handler(CommandHandler('infouser', infouser_command))
+    application.add_handler(CommandHandler('metrics', metrics_command))
+    application.add_handler(CommandHandler('rebuildtotals', rebuild_totals_command))
     application.add_handler(CommandHandler('exportusers', export_users_command))
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('start', start)],
@@ -1578,21 +1449,50 @@ def main() -> None:
                 MessageHandler(filters.TEXT & ~filters.COMMAND, save_hourly_rate),
             ],
             SELECT_MONTH: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, view_selected_month_report),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_history_menu),
             ],
+            # Стани історії зі збережених розмов до переходу на інлайн-навігацію
             SELECT_DAY: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, view_selected_day_report),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_history_menu),
             ],
             VIEW_SELECTED_REPORT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_selected_report),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_history_menu),
             ],
         },
-        fallbacks=[CommandHandler('start', start)],
+        # Кнопки інлайн-списків лишаються робочими в будь-якому стані розмови
+        fallbacks=[CommandHandler('start', start),
+                   CallbackQueryHandler(handle_list_page,
+                                        pattern=callback_pattern((EDIT_LIST, DELETE_LIST, MONTH_LIST, DAY_LIST)))],
         per_message=False,
+        name='main',
+        persistent=True,
     )
-    print("\033[5;32m🎉 Бот успішно запущений та готовий до роботи! 🟢\033[0m")
     application.add_handler(conv_handler)
-    application.run_polling()
+    persistence.track(application, conv_handler)
+    handler_metrics.instrument_application(application)
+    return application
+
+def main() -> None:
+    logging.getLogger('telegram.ext').setLevel(logging.WARNING)
+    application = build_application()
+    print("\033[5;32m🎉 Бот успішно запущений та готовий до роботи! 🟢\033[0m")
+    if config.RUN_MODE == 'webhook':
+        if not config.WEBHOOK_URL:
+            raise RuntimeError("Для режиму webhook потрібна змінна TIMEKEEPER_WEBHOOK_URL")
+        application.run_webhook(
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            url_path=config.WEBHOOK_PATH,
+            webhook_url=f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}",
+            secret_token=config.WEBHOOK_SECRET,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            cert=config.WEBHOOK_CERT,
+            key=config.WEBHOOK_KEY,
+        )
+    elif config.RUN_MODE == 'polling':
+        application.run_polling()
+    else:
+        raise RuntimeError(f"Невідомий режим запуску {config.RUN_MODE}, очікується один з {config.RUN_MODES}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,219 @@
+import asyncio
+import functools
+import logging
+import time
+
+from telegram.ext import ApplicationHandlerStop, ConversationHandler
+
+from storage import current_handler, current_statements
+
+logger = logging.getLogger(__name__)
+
+# Верхні межі кошиків гістограми затримки обробників, с
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class HandlerStats:
+    """Накопичена статистика одного обробника"""
+
+    __slots__ = ('calls', 'errors', 'seconds', 'statements', 'buckets')
+
+    def __init__(self, bucket_count: int):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.statements = 0
+        # Кількість викликів у кожному кошику; останній — понад найбільшу межу
+        self.buckets = [0] * (bucket_count + 1)
+
+
+class HandlerMetrics:
+    """Затримка, виклики, помилки та SQL-інструкції кожного обробника бота.
+
+    `instrument_application` обгортає callback кожного зареєстрованого
+    обробника, зокрема станів ConversationHandler. Обгортка міряє час
+    виконання і встановлює `storage.current_statements` і `current_handler`,
+    тож інструкції, виконані сховищем для цього виклику, зараховуються
+    обробнику (зокрема в журналі sqltrace).
+    Статистика агрегується за іменем callback-функції.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._handlers = {}
+        # назва -> (опис, функція без аргументів) для додаткових показників
+        self._gauges = {}
+
+    def observe(self, name: str, seconds: float, statements: int, failed: bool) -> None:
+        stats = self._handlers.get(name)
+        if stats is None:
+            stats = self._handlers[name] = HandlerStats(len(self.buckets))
+        stats.calls += 1
+        stats.errors += failed
+        stats.seconds += seconds
+        stats.statements += statements
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        stats.buckets[index] += 1
+
+    def wrap(self, callback):
+        """Обгортка корутини-обробника, що записує її виклики"""
+        name = getattr(callback, '__name__', repr(callback))
+
+        @functools.wraps(callback)
+        async def instrumented(update, context):
+            sink = [0]
+            token = current_statements.set(sink)
+            handler_token = current_handler.set(name)
+            started = time.perf_counter()
+            failed = False
+            try:
+                return await callback(update, context)
+            except ApplicationHandlerStop:
+                raise
+            except Exception:
+                failed = True
+                raise
+            finally:
+                current_statements.reset(token)
+                current_handler.reset(handler_token)
+                self.observe(name, time.perf_counter() - started, sink[0], failed)
+
+        return instrumented
+
+    def instrument(self, handler) -> None:
+        if isinstance(handler, ConversationHandler):
+            for inner in handler.entry_points + handler.fallbacks:
+                self.instrument(inner)
+            for state_handlers in handler.states.values():
+                for inner in state_handlers:
+                    self.instrument(inner)
+        elif not hasattr(handler.callback, '__wrapped__'):
+            handler.callback = self.wrap(handler.callback)
+
+    def instrument_application(self, application) -> None:
+        """Інструментує всі обробники, вже додані до застосунку"""
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                self.instrument(handler)
+
+    def add_gauge(self, name: str, description: str, value) -> None:
+        """Додатковий показник, що обчислюється value() під час кожного звіту"""
+        self._gauges[name] = (description, value)
+
+    def quantile(self, stats: HandlerStats, q: float) -> float:
+        """Оцінка квантиля q (0-1) за гістограмою: верхня межа кошика, де він лежить"""
+        target = q * stats.calls
+        seen = 0
+        for bound, count in zip(self.buckets, stats.buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> dict:
+        """Статистика за назвою обробника, найдорожчі за сумарним часом — першими"""
+        ordered = sorted(self._handlers.items(), key=lambda item: item[1].seconds, reverse=True)
+        return {
+            name: {
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'avg_ms': stats.seconds / stats.calls * 1e3,
+                'p50_ms': self.quantile(stats, 0.5) * 1e3,
+                'p95_ms': self.quantile(stats, 0.95) * 1e3,
+                'p99_ms': self.quantile(stats, 0.99) * 1e3,
+                'statements_per_call': stats.statements / stats.calls,
+            }
+            for name, stats in ordered
+        }
+
+    def render_text(self, limit: int = 25) -> str:
+        """Звіт для адміністратора в Telegram"""
+        uptime = int(time.time() - self.started)
+        lines = [f"📈 Метрики обробників за {uptime // 3600} год {uptime % 3600 // 60} хв:", ""]
+        snapshot = self.snapshot()
+        if not snapshot:
+            lines.append("Обробники ще не викликалися.")
+        for name, stats in list(snapshot.items())[:limit]:
+            p95 = '>10 с' if stats['p95_ms'] == float('inf') else f"≤{stats['p95_ms']:.0f} мс"
+            lines.append(
+                f"{name}: {stats['calls']} викл., помилок {stats['errors']}, "
+                f"сер. {stats['avg_ms']:.1f} мс, p95 {p95}, SQL {stats['statements_per_call']:.1f}/викл."
+            )
+        if self._gauges:
+            lines.append("")
+            for name, (description, value) in self._gauges.items():
+                lines.append(f"{description}: {value()}")
+        return "\n".join(lines)
+
+    def render_prometheus(self) -> str:
+        """Показники у текстовому форматі Prometheus"""
+        lines = [
+            '# HELP timekeeper_handler_duration_seconds Час виконання обробника.',
+            '# TYPE timekeeper_handler_duration_seconds histogram',
+        ]
+        for name, stats in self._handlers.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, stats.buckets):
+                cumulative += count
+                lines.append(f'timekeeper_handler_duration_seconds_bucket{{handler="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'timekeeper_handler_duration_seconds_bucket{{handler="{name}",le="+Inf"}} {stats.calls}')
+            lines.append(f'timekeeper_handler_duration_seconds_sum{{handler="{name}"}} {stats.seconds}')
+            lines.append(f'timekeeper_handler_duration_seconds_count{{handler="{name}"}} {stats.calls}')
+        for metric, field, description in (
+            ('timekeeper_handler_errors_total', 'errors', 'Виклики обробника, що завершилися винятком.'),
+            ('timekeeper_handler_sql_statements_total', 'statements', 'SQL-інструкції, виконані обробником.'),
+        ):
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} counter')
+            for name, stats in self._handlers.items():
+                lines.append(f'{metric}{{handler="{name}"}} {getattr(stats, field)}')
+        for name, (description, value) in self._gauges.items():
+            lines.append(f'# HELP timekeeper_{name} {description}.')
+            lines.append(f'# TYPE timekeeper_{name} gauge')
+            lines.append(f'timekeeper_{name} {value()}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Мінімальний HTTP-сервер, що віддає `GET /metrics` у форматі Prometheus"""
+
+    def __init__(self, metrics: HandlerMetrics, host: str, port: int):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            # Заголовки запиту не потрібні, але їх слід дочитати до порожнього рядка
+            while await reader.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b'GET' and parts[1].split(b'?')[0] == b'/metrics':
+                status, content_type = '200 OK', 'text/plain; version=0.0.4; charset=utf-8'
+                body = self.metrics.render_prometheus().encode('utf-8')
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain; charset=utf-8', b'not found\n'
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Помилка відповіді на запит метрик: {e}")
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Метрики Prometheus доступні на http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,181 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Класи пріоритету вихідних запитів (менше число — вищий пріоритет).
+# Передаються через rate_limit_args методів бота, за замовчуванням — інтерактивний.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REMINDER = 1
+PRIORITY_ADMIN = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_REMINDER: 'reminder',
+    PRIORITY_ADMIN: 'admin',
+}
+
+
+class TokenBucket:
+    """Відро токенів: `rate` запитів за секунду з допустимим сплеском `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Скільки секунд чекати до появи вільного токена"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self) -> float:
+        """Бронює токен (можливо, в борг) і повертає, скільки секунд чекати до його появи"""
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Центральна черга вихідних повідомлень з урахуванням лімітів Telegram.
+
+    Кожен запит з chat_id спершу чекає на токен свого чату (окремі ліміти для
+    особистих чатів і груп), потім стає в загальну чергу з пріоритетом.
+    Диспетчер видає загальні токени за пріоритетом: інтерактивні відповіді,
+    потім нагадування, потім сповіщення адміністратору. Після RetryAfter
+    відправлення призупиняється для всіх на вказаний Telegram час, а запит
+    повторюється до max_retries разів.
+    """
+
+    def __init__(self, global_rate: float = 30, private_chat_rate: float = 1, private_chat_burst: float = 3,
+                 group_chat_rate: float = 20 / 60, group_chat_burst: float = 3, max_retries: int = 3):
+        self._global = TokenBucket(global_rate, global_rate)
+        self._private_chat_rate = private_chat_rate
+        self._private_chat_burst = private_chat_burst
+        self._group_chat_rate = group_chat_rate
+        self._group_chat_burst = group_chat_burst
+        self._max_retries = max_retries
+        self._chat_buckets = {}
+        self._waiting = []
+        self._seq = itertools.count()
+        self._dispatcher = None
+        self._wakeup = None
+        self._paused_until = 0.0
+        self._sent = dict.fromkeys(PRIORITY_NAMES, 0)
+        self._wait_time = dict.fromkeys(PRIORITY_NAMES, 0.0)
+        self._max_wait = dict.fromkeys(PRIORITY_NAMES, 0.0)
+        self._retry_after_hits = 0
+
+    async def initialize(self) -> None:
+        self._wakeup = asyncio.Event()
+
+    async def shutdown(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 1024:
+                self._chat_buckets = {key: value for key, value in self._chat_buckets.items()
+                                      if not value.is_full()}
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self._group_chat_rate, self._group_chat_burst)
+            else:
+                bucket = TokenBucket(self._private_chat_rate, self._private_chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, priority: int) -> None:
+        if not self._waiting and time.monotonic() >= self._paused_until and self._global.delay() == 0:
+            self._global.reserve()
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self) -> None:
+        while self._waiting:
+            pause = self._paused_until - time.monotonic()
+            delay = max(pause, self._global.delay())
+            if delay > 0:
+                self._wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                continue
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self._global.reserve()
+                future.set_result(None)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+        priority = rate_limit_args if rate_limit_args in PRIORITY_NAMES else PRIORITY_INTERACTIVE
+
+        queued_at = time.monotonic()
+        chat_delay = self._chat_bucket(chat_id).reserve()
+        if chat_delay > 0:
+            await asyncio.sleep(chat_delay)
+        for attempt in range(self._max_retries + 1):
+            await self._acquire(priority)
+            if attempt == 0:
+                waited = time.monotonic() - queued_at
+                self._sent[priority] += 1
+                self._wait_time[priority] += waited
+                self._max_wait[priority] = max(self._max_wait[priority], waited)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                self._retry_after_hits += 1
+                if attempt == self._max_retries:
+                    logger.error(f"Ліміт Telegram перевищено після {self._max_retries} повторних спроб ({endpoint})")
+                    raise
+                retry_after = exc.retry_after
+                if not isinstance(retry_after, (int, float)):
+                    retry_after = retry_after.total_seconds()
+                logger.warning(f"Ліміт Telegram перевищено, відправлення призупинено на {retry_after} с")
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after + 0.1)
+
+    def stats(self) -> dict:
+        """Поточна черга та накопичена статистика за класами пріоритету"""
+        backlog = dict.fromkeys(PRIORITY_NAMES.values(), 0)
+        for priority, _, future in self._waiting:
+            if not future.done():
+                backlog[PRIORITY_NAMES[priority]] += 1
+        return {
+            'backlog': backlog,
+            'sent': {PRIORITY_NAMES[p]: count for p, count in self._sent.items()},
+            'avg_wait': {PRIORITY_NAMES[p]: (self._wait_time[p] / count if count else 0.0)
+                         for p, count in self._sent.items()},
+            'max_wait': {PRIORITY_NAMES[p]: wait for p, wait in self._max_wait.items()},
+            'retry_after_hits': self._retry_after_hits,
+            'paused_for': max(0.0, self._paused_until - time.monotonic()),
+        }
@@ -0,0 +1,66 @@
+from typing import NamedTuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Дії кнопок сторінки; callback_data має вигляд <екран><дія><значення>
+SELECT = '='
+OLDER = '>'
+NEWER = '<'
+
+
+class Page(NamedTuple):
+    """Рядки сторінки від найновішого і чи є сторінки старші та новіші за неї"""
+    rows: list
+    has_older: bool
+    has_newer: bool
+
+
+async def load_page(fetch, key, older: bool, size: int) -> Page:
+    """Сторінка з size рядків, старших (older) або новіших за ключ key; key=None — перша сторінка.
+
+    fetch(key, older, limit) — keyset-запит, що повертає рядки від найновішого. Один зайвий
+    рядок показує, чи є сторінка далі. Якщо новіших рядків не набирається на повну сторінку
+    або за ключем уже нічого немає (рядки видалено), повертається перша сторінка.
+    """
+    rows = await fetch(key, older, size + 1)
+    more = len(rows) > size
+    if key is None:
+        return Page(rows[:size], more, False)
+    if older:
+        if not rows:
+            return await load_page(fetch, None, True, size)
+        return Page(rows[:size], more, True)
+    if not more:
+        return await load_page(fetch, None, True, size)
+    return Page(rows[-size:], True, True)
+
+
+def page_markup(screen: str, page: Page, button, extra=()) -> InlineKeyboardMarkup:
+    """Інлайн-клавіатура сторінки: кнопка на кожен рядок, стрілки до новішої та старішої сторінок
+    і рядки extra під ними.
+
+    button(row) -> (підпис, значення для вибору, курсор); стрілки несуть курсор крайнього
+    рядка сторінки, тож наступна сторінка читається від нього без повторного запиту попередніх.
+    """
+    buttons = [button(row) for row in page.rows]
+    keyboard = [[InlineKeyboardButton(label, callback_data=f"{screen}{SELECT}{value}")]
+                for label, value, _ in buttons]
+    navigation = []
+    if page.has_newer:
+        navigation.append(InlineKeyboardButton('◀️', callback_data=f"{screen}{NEWER}{buttons[0][2]}"))
+    if page.has_older:
+        navigation.append(InlineKeyboardButton('▶️', callback_data=f"{screen}{OLDER}{buttons[-1][2]}"))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.extend(extra)
+    return InlineKeyboardMarkup(keyboard)
+
+
+def callback_pattern(screens) -> str:
+    """Регулярний вираз для callback_data кнопок сторінок екранів screens"""
+    return f"^[{''.join(screens)}][{SELECT}{OLDER}{NEWER}]"
+
+
+def parse_callback(data: str) -> tuple:
+    """(екран, дія, значення) з callback_data кнопки сторінки"""
+    return data[0], data[1], data[2:]
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+
+class SQLitePersistence(BasePersistence):
+    """Персистентність user_data і станів ConversationHandler у SQLite.
+
+    Дані користувача підвантажуються ліниво в refresh_user_data, який PTB
+    викликає перед обробкою кожного оновлення, тож при старті нічого не
+    читається наперед. У пам'яті тримається лише робочий набір з
+    `working_set` останніх активних користувачів: найдавніший витісняється
+    з application.user_data, а його незбережені зміни записуються в базу.
+    Словники розмов чистяться від станів користувачів поза робочим набором,
+    коли перевищують подвійний розмір набору. Зміни одного циклу
+    update_persistence пишуться однією транзакцією.
+
+    Розмови мають бути per_user: останній елемент ключа — user_id.
+    """
+
+    def __init__(self, db, working_set: int = 10000, update_interval: float = 5):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._db = db
+        self._application = None
+        self._handlers = {}
+        self._sessions = LRUCache(maxsize=working_set, on_evict=self._evict)
+        self._pending_user_data = {}
+        self._pending_conversations = {}
+        self._evicted = set()
+        self._flush_task = None
+
+    def track(self, application, *handlers) -> None:
+        """Реєструє застосунок і персистентні ConversationHandler, стани яких підвантажуються ліниво"""
+        self._application = application
+        for handler in handlers:
+            self._handlers[handler.name] = handler
+
+    # PTB не має публічного API для станів окремих ключів розмови, тому робочий
+    # набір змінюється напряму в TrackingDict обробника без позначки на запис
+    @staticmethod
+    def _restore_state(handler, key, state) -> None:
+        if key not in handler._conversations:
+            handler._conversations.update_no_track({key: state})
+
+    @staticmethod
+    def _forget_idle_states(handler, is_resident) -> dict:
+        """Прибирає стани користувачів поза робочим набором, крім ще не переданих у update_conversation"""
+        conversations = handler._conversations
+        idle = [key for key in conversations.data
+                if not is_resident(key[-1]) and key not in conversations._write_access_keys]
+        return {key: conversations.data.pop(key) for key in idle}
+
+    # --- Ліниве завантаження і витіснення ---
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if self._sessions.get(user_id) is not None:
+            return
+        data, conversations = await self._db.get_session(user_id)
+        if user_id in self._sessions:
+            # Паралельне оновлення того ж користувача вже завантажило сесію
+            return
+        if user_id in self._pending_user_data:
+            # Незаписані зміни витісненого користувача новіші за базу
+            data = self._pending_user_data[user_id]
+        states = {(name, tuple(json.loads(key))): state for name, key, state in conversations}
+        for (pending_user, name, key), state in self._pending_conversations.items():
+            if pending_user == user_id:
+                states[(name, tuple(json.loads(key)))] = state
+
+        user_data.update(json.loads(data) if data else {})
+        for (name, key), state in states.items():
+            handler = self._handlers.get(name)
+            if handler is not None and state is not None:
+                self._restore_state(handler, key, state)
+        # Значення в робочому наборі — останній збережений JSON user_data
+        self._sessions.put(user_id, data or _encode({}))
+
+    def _evict(self, user_id, saved) -> None:
+        user_data = self._application.user_data.get(user_id)
+        if user_data is not None:
+            encoded = _encode(user_data)
+            if encoded != saved:
+                self._pending_user_data[user_id] = encoded if user_data else None
+        # Application передасть це видалення в drop_user_data, яке для витіснених пропускається
+        self._evicted.add(user_id)
+        self._application.drop_user_data(user_id)
+        for name, handler in self._handlers.items():
+            if len(handler._conversations) > 2 * self._sessions.maxsize:
+                for key, state in self._forget_idle_states(handler, self._sessions.__contains__).items():
+                    if isinstance(state, int):
+                        self._pending_conversations[(key[-1], name, _encode(list(key)))] = state
+        self._schedule_flush()
+
+    def stats(self) -> dict:
+        return {
+            **self._sessions.stats(),
+            'pending_user_data': len(self._pending_user_data),
+            'pending_conversations': len(self._pending_conversations),
+        }
+
+    # --- Запис змін ---
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        saved = self._sessions.peek(user_id)
+        if saved is None:
+            # Дані поза робочим набором не є актуальними — їх уже записано під час витіснення
+            return
+        encoded = _encode(data)
+        if encoded == saved:
+            return
+        self._sessions.put(user_id, encoded)
+        self._pending_user_data[user_id] = encoded if data else None
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if user_id in self._evicted:
+            self._evicted.discard(user_id)
+            return
+        self._sessions.invalidate(user_id)
+        self._pending_user_data[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        self._pending_conversations[(key[-1], name, _encode(list(key)))] = new_state
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        # Даємо решті update_* поточного циклу потрапити в ту саму пачку
+        await asyncio.sleep(0)
+        while self._pending_user_data or self._pending_conversations:
+            user_data, self._pending_user_data = self._pending_user_data, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            try:
+                await self._db.save_sessions(
+                    user_data.items(),
+                    [(*conversation_key, state) for conversation_key, state in conversations.items()],
+                )
+            except Exception as e:
+                logger.error(f"Помилка збереження сесій користувачів: {e}")
+                # Новіші зміни, що надійшли під час запису, мають пріоритет
+                self._pending_user_data = {**user_data, **self._pending_user_data}
+                self._pending_conversations = {**conversations, **self._pending_conversations}
+                return
+
+    async def flush(self) -> None:
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._write_pending()
+
+    # --- Дані, які бот не зберігає ---
+
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ('id', 'username', 'first_name', 'last_name', 'is_bot', 'language_code')
+
+
+def profile_from_user(user) -> dict:
+    """Профіль у форматі get_user_info з об'єкта telegram.User"""
+    return {field: getattr(user, field) for field in PROFILE_FIELDS}
+
+
+class UserProfiles:
+    """Локальний кеш профілів користувачів Telegram у таблиці user_profiles.
+
+    Профілі оновлюються безкоштовно з `update.effective_user` кожного
+    оновлення, тож адміністративні команди відповідають без звернень до API.
+    Фоновий таск поступово оновлює застарілі профілі, не перевищуючи
+    `refresh_batch` запитів до API за `refresh_interval` секунд.
+    """
+
+    def __init__(self, db, max_age: float = 7 * 24 * 3600, refresh_interval: float = 60,
+                 refresh_batch: int = 20, cache_size: int = 10000):
+        self._db = db
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.refresh_batch = refresh_batch
+        # user_id -> (профіль, час отримання)
+        self._cache = LRUCache(maxsize=cache_size)
+        self._task = None
+
+    async def _load(self, user_id):
+        entry = self._cache.peek(user_id)
+        if entry is None:
+            row = await self._db.get_profile(user_id)
+            if row is not None:
+                entry = (dict(zip(PROFILE_FIELDS, row[:-1])), row[-1])
+                self._cache.put(user_id, entry)
+        return entry
+
+    async def get(self, user_id: int):
+        """Профіль з локального кешу або None, якщо користувач невідомий"""
+        entry = await self._load(user_id)
+        return entry[0] if entry else None
+
+    async def get_many(self, user_ids: list) -> dict:
+        """Профілі всіх відомих користувачів зі списку одним запитом до БД"""
+        rows = await self._db.get_profiles(list(user_ids))
+        return {row[0]: dict(zip(PROFILE_FIELDS, row[:-1])) for row in rows}
+
+    async def store(self, profile: dict) -> None:
+        fetched_at = int(time.time())
+        await self._db.save_profile(profile, fetched_at)
+        self._cache.put(profile['id'], (profile, fetched_at))
+
+    async def remember(self, user) -> None:
+        """Зберігає профіль з оновлення, якщо він змінився або застарів"""
+        profile = profile_from_user(user)
+        entry = await self._load(user.id)
+        if entry is None or entry[0] != profile or entry[1] < time.time() - self.max_age / 2:
+            await self.store(profile)
+
+    async def start(self, bot, fetch) -> None:
+        """Запускає фонове оновлення застарілих профілів.
+
+        fetch(bot, user_id) — корутина, що повертає профіль з Telegram API або None.
+        """
+        self._task = asyncio.create_task(self._refresh_loop(bot, fetch))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self, bot, fetch) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                stale = await self._db.get_stale_profiles(int(time.time() - self.max_age), self.refresh_batch)
+                for user_id in stale:
+                    profile = await fetch(bot, user_id)
+                    if profile:
+                        await self.store(profile)
+                    else:
+                        # Недоступний профіль не запитуємо знову до наступного циклу застарівання
+                        await self._db.touch_profile(user_id, int(time.time()))
+                        self._cache.invalidate(user_id)
+                    await asyncio.sleep(self.refresh_interval / (2 * self.refresh_batch))
+                if stale:
+                    logger.info(f"Оновлено застарілих профілів користувачів: {len(stale)}")
+            except Exception as e:
+                logger.error(f"Помилка фонового оновлення профілів: {e}")
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from timezones import zone_offsets
+
+
+def local_epoch(date: str, time: str, timezone: str) -> int:
+    """Секунди епохи UTC для місцевого часу ГГ:ХХ:СС дати РРРР-ММ-ДД у часовому поясі"""
+    return zone_offsets(timezone).to_epoch(date, time)
+
+
+def departure_epoch(date: str, time: str, timezone: str, start_at: Optional[int]) -> int:
+    """Секунди епохи UTC для введеного вручну часу відходу зміни, що почалася date.
+
+    Час відходу, раніший за прихід, означає нічну зміну, що закінчилась
+    наступного дня.
+    """
+    end_at = local_epoch(date, time, timezone)
+    if start_at is not None and end_at < start_at:
+        next_day = (datetime.fromisoformat(date) + timedelta(days=1)).date().isoformat()
+        end_at = local_epoch(next_day, time, timezone)
+    return end_at
+
+
+def local_clock(epoch: Optional[int], timezone: str) -> Optional[str]:
+    """Місцевий час ГГ:ХХ:СС для секунд епохи UTC або None"""
+    if epoch is None:
+        return None
+    return zone_offsets(timezone).clock(epoch)
+
+
+def shift_seconds(date: str, arrival_time: str, departure_time: str, timezone: str):
+    """Тривалість зміни з часом у форматі ГГ:ХХ:СС або None, якщо зміну ще не закрито.
+
+    Потрібна міграціям схеми, що переносять записи з текстовим часом.
+    """
+    if not (arrival_time and departure_time):
+        return None
+    start_at = local_epoch(date, arrival_time, timezone)
+    return departure_epoch(date, departure_time, timezone, start_at) - start_at
+
+
+class ShiftRecord(NamedTuple):
+    """Зміна: ідентифікатор, робочий день, межі в секундах епохи UTC і часовий пояс на момент запису"""
+    id: int
+    date: str
+    start_at: Optional[int]
+    end_at: Optional[int]
+    timezone: str
+
+    @property
+    def worked_seconds(self) -> Optional[int]:
+        if self.start_at is None or self.end_at is None:
+            return None
+        return self.end_at - self.start_at
+
+    @property
+    def hours(self) -> Optional[float]:
+        """Відпрацьовані години або None для незакритої зміни"""
+        seconds = self.worked_seconds
+        return seconds / 3600 if seconds is not None else None
+
+    @property
+    def arrival_time(self) -> Optional[str]:
+        return local_clock(self.start_at, self.timezone)
+
+    @property
+    def departure_time(self) -> Optional[str]:
+        return local_clock(self.end_at, self.timezone)
+
+
+class MonthTotals(NamedTuple):
+    """Підсумки за місяць: (дата, години) для кожного дня з закритими змінами та загальна сума"""
+    has_records: bool
+    days: list
+    total_hours: float
+
+
+async def month_totals(db, user_id: int, month: str) -> MonthTotals:
+    """Підсумки за місяць РРРР-ММ: загальна сума зі зведеної таблиці monthly_totals,
+    розбивка по днях — одним агрегатним запитом по індексу"""
+    summary = await db.get_month_summary(user_id, month)
+    if summary is None:
+        return MonthTotals(False, [], 0.0)
+    _, total_seconds = summary
+    rows = await db.get_month_day_totals(user_id, month)
+    days = [(date, seconds / 3600) for date, seconds in rows if seconds is not None]
+    return MonthTotals(True, days, total_seconds / 3600)
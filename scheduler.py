@@ -0,0 +1,116 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """Планувальник нагадувань про кінець зміни, що переживає перезапуск бота.
+
+    Нагадування зберігаються в таблиці shift_reminders і дублюються в купі
+    (heap) за часом спрацювання. Один фоновий таск спить до найближчого
+    нагадування і за одне пробудження надсилає всю пачку, що настала.
+    Скасування позначає запис неактивним, а застарілі елементи купи
+    відкидаються під час вибірки.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._send = None
+        self._bot = None
+        self._heap = []
+        self._active = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    async def start(self, bot, send) -> None:
+        """Завантажує збережені нагадування і запускає фоновий таск.
+
+        send(bot, user_id, shift_end) — корутина, що надсилає одне нагадування.
+        """
+        self._bot = bot
+        self._send = send
+        for user_id, remind_at, shift_end in await self._db.get_pending_reminders():
+            self._push(user_id, remind_at, shift_end)
+        logger.info(f"Завантажено нагадувань про кінець зміни: {len(self._active)}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def schedule(self, user_id: int, remind_at: float, shift_end: float) -> None:
+        """Планує (або переплановує) нагадування користувачу; час — у секундах епохи UTC"""
+        await self._db.save_reminder(user_id, int(remind_at), int(shift_end))
+        self._push(user_id, int(remind_at), int(shift_end))
+
+    async def cancel(self, user_id: int) -> None:
+        if self._active.pop(user_id, None) is not None:
+            await self._db.delete_reminders([user_id])
+
+    def _push(self, user_id, remind_at, shift_end):
+        seq = next(self._seq)
+        self._active[user_id] = seq
+        heapq.heappush(self._heap, (remind_at, seq, user_id, shift_end))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+        # Купа не повинна розростатися через скасовані елементи
+        if len(self._heap) > 2 * len(self._active) + 64:
+            self._heap = [entry for entry in self._heap if self._active.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, user_id, shift_end = heapq.heappop(self._heap)
+            if self._active.get(user_id) == seq:
+                del self._active[user_id]
+                due.append((user_id, shift_end))
+        return due
+
+    def _next_delay(self, now):
+        while self._heap and self._active.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] - now if self._heap else None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            due = self._pop_due(now)
+            if due:
+                try:
+                    await self._deliver(due, now)
+                except Exception as e:
+                    logger.error(f"Помилка обробки пачки нагадувань: {e}")
+                continue
+            delay = self._next_delay(now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, due, now) -> None:
+        await self._db.delete_due_reminders(int(now))
+        sends = []
+        for user_id, shift_end in due:
+            if shift_end <= now:
+                logger.warning(f"Нагадування користувачу {user_id} пропущено: зміна вже закінчилась")
+                continue
+            sends.append(self._send(self._bot, user_id, shift_end))
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Помилка надсилання нагадування: {result}")
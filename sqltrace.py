@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+
+from storage import current_handler
+
+logger = logging.getLogger(__name__)
+
+# Режими трасування SQL: вимкнено, лише повільні інструкції, усі інструкції
+TRACE_MODES = ('off', 'slow', 'all')
+
+# Інструкції, для яких має сенс EXPLAIN QUERY PLAN
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def _rows(result) -> int:
+    """Розмір результату операції сховища: список — усі рядки, кортеж — один, інше (запис) — 0.
+
+    Trace-callback SQLite не повідомляє, скільки рядків дала окрема інструкція,
+    тож це число описує операцію загалом, а не кожну її інструкцію.
+    """
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        return 1
+    return 0
+
+
+class QueryProfiler:
+    """Профайлер SQL поверх trace-callback з'єднань Storage.
+
+    Trace-callback SQLite повідомляє лише про початок інструкції, тому
+    тривалість інструкції — час до початку наступної в тій самій операції
+    сховища (або до її завершення): операції виконуються синхронно в одному
+    потоці БД. Для кожної пари (обробник, операція) накопичуються виклики,
+    час, інструкції та розмір результатів операції. Інструкції, довші за
+    `slow_ms`, разом з EXPLAIN QUERY PLAN пишуться в окремий журнал
+    `log_path`; у режимі 'all' туди пишеться кожна інструкція. EXPLAIN
+    виконується з вимкненим trace-callback'ом, тож не потрапляє ні в
+    лічильники інструкцій Storage та обробника, ні в сам профайлер.
+    """
+
+    def __init__(self, mode: str = 'slow', slow_ms: float = 50, log_path: str = 'slow_queries.log'):
+        if mode not in TRACE_MODES or mode == 'off':
+            raise ValueError(f"Недопустимий режим трасування SQL: {mode}")
+        self.mode = mode
+        self.slow_seconds = slow_ms / 1000
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (обробник, операція) -> [викликів, секунд, найдовший виклик, інструкцій, рядків у результатах]
+        self._operations = {}
+        self.slow_statements = 0
+        self.log = logging.getLogger('timekeeper.sql')
+        self.log.setLevel(logging.INFO)
+        self.log.propagate = False
+        if not self.log.handlers:
+            handler = logging.FileHandler(log_path, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.log.addHandler(handler)
+
+    def on_statement(self, statement: str) -> None:
+        """Викликається trace-callback'ом з'єднання на початку кожної інструкції"""
+        events = getattr(self._local, 'events', None)
+        if events is not None:
+            events.append((time.perf_counter(), statement))
+
+    def profile(self, conn, fn, args, trace=None):
+        """Виконує операцію сховища fn(conn, *args), записуючи її інструкції.
+
+        trace — trace-callback з'єднання, який повертається після EXPLAIN повільних інструкцій.
+        """
+        events = self._local.events = []
+        started = time.perf_counter()
+        try:
+            result = fn(conn, *args)
+        except Exception:
+            result = None
+            raise
+        finally:
+            finished = time.perf_counter()
+            self._local.events = None
+            self._record(conn, trace, getattr(fn, '__name__', repr(fn)), events, started, finished, result)
+        return result
+
+    def _record(self, conn, trace, operation, events, started, finished, result):
+        handler = current_handler.get() or '-'
+        rows = _rows(result)
+        with self._lock:
+            stats = self._operations.get((handler, operation))
+            if stats is None:
+                stats = self._operations[(handler, operation)] = [0, 0.0, 0.0, 0, 0]
+            stats[0] += 1
+            stats[1] += finished - started
+            stats[2] = max(stats[2], finished - started)
+            stats[3] += len(events)
+            stats[4] += rows
+        ends = [event[0] for event in events[1:]] + [finished]
+        for (statement_started, statement), statement_finished in zip(events, ends):
+            duration = statement_finished - statement_started
+            slow = duration >= self.slow_seconds
+            if not slow and self.mode != 'all':
+                continue
+            message = (f"{duration * 1e3:.2f} мс | обробник {handler} | {operation} | "
+                       f"результат операції {rows} рядк. | {statement.strip()}")
+            if slow:
+                self.slow_statements += 1
+                message = "ПОВІЛЬНО " + message + self._explain(conn, trace, statement)
+            self.log.info(message)
+
+    @staticmethod
+    def _explain(conn, trace, statement) -> str:
+        if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return ""
+        conn.set_trace_callback(None)
+        try:
+            plan = conn.execute(f'EXPLAIN QUERY PLAN {statement}').fetchall()
+        except Exception as e:
+            return f"\n    план недоступний: {e}"
+        finally:
+            conn.set_trace_callback(trace)
+        return "".join(f"\n    план: {row[-1]}" for row in plan)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._operations.clear()
+            self.slow_statements = 0
+
+    def snapshot(self) -> list:
+        """Статистика операцій, найдорожчі за сумарним часом — першими"""
+        with self._lock:
+            items = list(self._operations.items())
+        items.sort(key=lambda item: item[1][1], reverse=True)
+        return [
+            {'handler': handler, 'operation': operation, 'calls': calls,
+             'total_ms': seconds * 1e3, 'avg_ms': seconds / calls * 1e3, 'max_ms': longest * 1e3,
+             'statements': statements, 'result_rows': rows}
+            for (handler, operation), (calls, seconds, longest, statements, rows) in items
+        ]
@@ -0,0 +1,934 @@
+import asyncio
+import contextvars
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from reports import ShiftRecord, departure_epoch, local_clock, local_epoch, shift_seconds
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'timekeeper.db'
+DEFAULT_TIMEZONE = 'Europe/Warsaw'
+
+# Поля запису, які дозволено редагувати вручну
+EDITABLE_TIME_FIELDS = ('arrival_time', 'departure_time')
+
+# Профілі налаштувань SQLite. journal_mode зберігається у файлі бази і встановлюється
+# один раз під час setup, решта PRAGMA діють у межах з'єднання і застосовуються до кожного з них.
+STORAGE_PROFILES = {
+    # WAL: читання не чекають на запис, коміт без fsync (лише на контрольних точках)
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 10000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -16000,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,
+    },
+    # WAL з fsync на кожен коміт — для дисків, де втрата останніх транзакцій неприйнятна
+    'wal-durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 10000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -16000,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,
+    },
+    # Стандартний журнал відкату SQLite, як до появи профілів
+    'rollback': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 10000,
+    },
+}
+DEFAULT_PROFILE = 'wal'
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+# Лічильник [n] для інструкцій поточного обробника та його назва; встановлює інструментування з metrics.py
+current_statements = contextvars.ContextVar('current_statements', default=None)
+current_handler = contextvars.ContextVar('current_handler', default=None)
+
+
+def month_bounds(month: str) -> tuple:
+    """Межі місяця РРРР-ММ як півінтервал дат [перший день, перший день наступного місяця)"""
+    year, month_number = map(int, month.split('-'))
+    if month_number == 12:
+        next_month = f"{year + 1:04d}-01"
+    else:
+        next_month = f"{year:04d}-{month_number + 1:02d}"
+    return f"{month}-01", f"{next_month}-01"
+
+
+def _keyset_page(conn, query, params, columns, key, older, limit):
+    """Сторінка запиту за ключем columns (keyset): до limit рядків, старших (older) або новіших
+    за key, від найновішого. query — SELECT ... WHERE без ORDER BY; key=None — найновіші рядки.
+
+    Межа сторінки — порівняння кортежів по індексу, тож кожна сторінка — обмежене читання
+    діапазону індексу без OFFSET і без сортування.
+    """
+    descending = older or key is None
+    if key is not None:
+        placeholders = ', '.join('?' for _ in columns)
+        query += f" AND ({', '.join(columns)}) {'<' if older else '>'} ({placeholders})"
+        params = (*params, *key)
+    order = ' DESC' if descending else ''
+    query += ' ORDER BY ' + ', '.join(column + order for column in columns) + ' LIMIT ?'
+    rows = conn.execute(query, (*params, limit)).fetchall()
+    return rows if descending else rows[::-1]
+
+
+def _migration_1_baseline(conn):
+    """Початкова схема бота"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS time_records
+        (date TEXT,
+         user_id INTEGER,
+         arrival_time TEXT,
+         departure_time TEXT)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS hourly_rates
+        (user_id INTEGER PRIMARY KEY,
+         rate DECIMAL(10,2))
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_timezones
+        (user_id INTEGER PRIMARY KEY,
+         timezone TEXT)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_languages
+        (user_id INTEGER PRIMARY KEY,
+         language TEXT DEFAULT 'uk')
+    ''')
+
+
+def _migration_2_time_records_key(conn):
+    """Первинний ключ і унікальний індекс (user_id, date) для time_records"""
+    conn.execute('''
+        CREATE TABLE time_records_new
+        (id INTEGER PRIMARY KEY,
+         date TEXT NOT NULL,
+         user_id INTEGER NOT NULL,
+         arrival_time TEXT,
+         departure_time TEXT)
+    ''')
+    # Дублікати за (user_id, date) лишаються від старої схеми без обмежень — зберігаємо перший запис
+    conn.execute('''
+        INSERT INTO time_records_new (date, user_id, arrival_time, departure_time)
+        SELECT date, user_id, arrival_time, departure_time
+        FROM time_records
+        WHERE rowid IN (SELECT MIN(rowid) FROM time_records GROUP BY user_id, date)
+        ORDER BY rowid
+    ''')
+    dropped = conn.execute('''
+        SELECT (SELECT COUNT(*) FROM time_records) - (SELECT COUNT(*) FROM time_records_new)
+    ''').fetchone()[0]
+    if dropped:
+        logger.warning(f"Міграція time_records: пропущено {dropped} дублікатів (user_id, date)")
+    conn.execute('DROP TABLE time_records')
+    conn.execute('ALTER TABLE time_records_new RENAME TO time_records')
+    conn.execute('CREATE UNIQUE INDEX idx_time_records_user_date ON time_records (user_id, date)')
+
+
+def _migration_3_worked_seconds(conn):
+    """Збережена тривалість зміни worked_seconds у time_records"""
+    conn.execute('ALTER TABLE time_records ADD COLUMN worked_seconds INTEGER')
+    rows = conn.execute('''
+        SELECT r.id, r.date, r.arrival_time, r.departure_time, COALESCE(tz.timezone, ?)
+        FROM time_records r
+        LEFT JOIN user_timezones tz ON tz.user_id = r.user_id
+        WHERE r.arrival_time IS NOT NULL AND r.departure_time IS NOT NULL
+    ''', (DEFAULT_TIMEZONE,)).fetchall()
+    conn.executemany('UPDATE time_records SET worked_seconds = ? WHERE id = ?',
+                     ((shift_seconds(date, arrival, departure, timezone), record_id)
+                      for record_id, date, arrival, departure, timezone in rows))
+
+
+def _migration_4_monthly_totals(conn):
+    """Зведена таблиця monthly_totals з підсумками за (user_id, month)"""
+    conn.execute('''
+        CREATE TABLE monthly_totals
+        (user_id INTEGER NOT NULL,
+         month TEXT NOT NULL,
+         record_count INTEGER NOT NULL,
+         total_seconds INTEGER NOT NULL,
+         PRIMARY KEY (user_id, month)) WITHOUT ROWID
+    ''')
+    _fill_monthly_totals(conn, 'worked_seconds')
+
+
+# Тривалість зміни в SQL для поточної схеми time_records
+WORKED_SECONDS = 'end_at - start_at'
+
+
+def _fill_monthly_totals(conn, worked: str = WORKED_SECONDS):
+    conn.execute(f'''
+        INSERT INTO monthly_totals (user_id, month, record_count, total_seconds)
+        SELECT user_id, substr(date, 1, 7), COUNT(*), COALESCE(SUM({worked}), 0)
+        FROM time_records
+        GROUP BY user_id, substr(date, 1, 7)
+    ''')
+
+
+def _apply_month_delta(conn, user_id, date, count_delta, seconds_delta):
+    """Оновлює monthly_totals у поточній транзакції запису"""
+    month = date[:7]
+    conn.execute('''
+        INSERT INTO monthly_totals (user_id, month, record_count, total_seconds)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id, month) DO UPDATE
+        SET record_count = record_count + excluded.record_count,
+            total_seconds = total_seconds + excluded.total_seconds
+    ''', (user_id, month, count_delta, seconds_delta))
+    if count_delta < 0:
+        conn.execute('DELETE FROM monthly_totals WHERE user_id = ? AND month = ? AND record_count <= 0',
+                     (user_id, month))
+
+
+def _migration_5_shift_reminders(conn):
+    """Таблиця запланованих нагадувань про кінець зміни"""
+    conn.execute('''
+        CREATE TABLE shift_reminders
+        (user_id INTEGER PRIMARY KEY,
+         remind_at INTEGER NOT NULL,
+         shift_end INTEGER NOT NULL)
+    ''')
+    conn.execute('CREATE INDEX idx_shift_reminders_remind_at ON shift_reminders (remind_at)')
+
+
+def _migration_6_user_profiles(conn):
+    """Локальний кеш профілів користувачів Telegram"""
+    conn.execute('''
+        CREATE TABLE user_profiles
+        (user_id INTEGER PRIMARY KEY,
+         username TEXT,
+         first_name TEXT,
+         last_name TEXT,
+         is_bot INTEGER,
+         language_code TEXT,
+         fetched_at INTEGER NOT NULL)
+    ''')
+    conn.execute('CREATE INDEX idx_user_profiles_fetched_at ON user_profiles (fetched_at)')
+
+
+def _migration_7_sessions(conn):
+    """Збережені user_data і стани розмов ConversationHandler"""
+    conn.execute('''
+        CREATE TABLE user_data
+        (user_id INTEGER PRIMARY KEY,
+         data TEXT NOT NULL)
+    ''')
+    conn.execute('''
+        CREATE TABLE conversations
+        (user_id INTEGER NOT NULL,
+         name TEXT NOT NULL,
+         key TEXT NOT NULL,
+         state INTEGER NOT NULL,
+         PRIMARY KEY (user_id, name, key)) WITHOUT ROWID
+    ''')
+
+
+def _migration_8_epoch_times(conn):
+    """Межі зміни в секундах епохи UTC з часовим поясом запису замість тексту ГГ:ХХ:СС"""
+    conn.execute('''
+        CREATE TABLE time_records_new
+        (id INTEGER PRIMARY KEY,
+         date TEXT NOT NULL,
+         user_id INTEGER NOT NULL,
+         start_at INTEGER,
+         end_at INTEGER,
+         timezone TEXT NOT NULL)
+    ''')
+    # Пояс на момент запису раніше не зберігався — беремо поточний пояс користувача
+    rows = conn.execute('''
+        SELECT r.id, r.date, r.user_id, r.arrival_time, r.departure_time, COALESCE(tz.timezone, ?)
+        FROM time_records r
+        LEFT JOIN user_timezones tz ON tz.user_id = r.user_id
+    ''', (DEFAULT_TIMEZONE,)).fetchall()
+
+    def convert():
+        for record_id, date, user_id, arrival, departure, timezone in rows:
+            start_at = local_epoch(date, arrival, timezone) if arrival else None
+            end_at = departure_epoch(date, departure, timezone, start_at) if departure else None
+            yield record_id, date, user_id, start_at, end_at, timezone
+
+    conn.executemany('''INSERT INTO time_records_new (id, date, user_id, start_at, end_at, timezone)
+                        VALUES (?, ?, ?, ?, ?, ?)''', convert())
+    conn.execute('DROP TABLE time_records')
+    conn.execute('ALTER TABLE time_records_new RENAME TO time_records')
+    conn.execute('CREATE UNIQUE INDEX idx_time_records_user_date ON time_records (user_id, date)')
+    # Нічні зміни через перехід на літній/зимовий час тепер рахуються точно — перераховуємо підсумки
+    conn.execute('DELETE FROM monthly_totals')
+    _fill_monthly_totals(conn)
+
+
+def _migration_9_multiple_shifts(conn):
+    """Кілька змін на день і частковий індекс відкритих змін"""
+    conn.execute('DROP INDEX idx_time_records_user_date')
+    conn.execute('CREATE INDEX idx_time_records_user_date ON time_records (user_id, date, start_at)')
+    # Відкриті зміни — крихітна частина таблиці, тож пошук активної зміни читає кілька сторінок індексу
+    conn.execute('CREATE INDEX idx_time_records_open ON time_records (user_id, start_at) WHERE end_at IS NULL')
+
+
+def _migration_10_swept_shifts(conn):
+    """Позначка swept_at для забутих змін і частковий індекс незакритих змін за часом початку"""
+    conn.execute('ALTER TABLE time_records ADD COLUMN swept_at INTEGER')
+    # Прибиральник шукає найдавніші відкриті зміни всіх користувачів, тож індекс починається з start_at
+    conn.execute('''CREATE INDEX idx_time_records_stale ON time_records (start_at)
+                    WHERE end_at IS NULL AND swept_at IS NULL''')
+
+
+# Міграції схеми; номер версії — позиція у списку, поточна версія зберігається в PRAGMA user_version
+MIGRATIONS = [
+    _migration_1_baseline,
+    _migration_2_time_records_key,
+    _migration_3_worked_seconds,
+    _migration_4_monthly_totals,
+    _migration_5_shift_reminders,
+    _migration_6_user_profiles,
+    _migration_7_sessions,
+    _migration_8_epoch_times,
+    _migration_9_multiple_shifts,
+    _migration_10_swept_shifts,
+]
+
+
+def migrate(conn, target: int = None) -> int:
+    """Застосовує до бази даних міграції, новіші за її PRAGMA user_version (до target включно)"""
+    target = len(MIGRATIONS) if target is None else target
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+    for version, migration in enumerate(MIGRATIONS[current:target], start=current + 1):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"Схему бази даних оновлено до версії {version}: {migration.__doc__}")
+    return max(current, target)
+
+
+def apply_connection_pragmas(conn, profile: str) -> None:
+    """Застосовує до з'єднання PRAGMA профілю, крім journal_mode"""
+    for pragma, value in STORAGE_PROFILES[profile].items():
+        if pragma != 'journal_mode':
+            conn.execute(f'PRAGMA {pragma} = {value}')
+
+
+def apply_journal_mode(conn, profile: str) -> str:
+    """Перемикає файл бази в режим журналу профілю; повертає фактичний режим"""
+    wanted = STORAGE_PROFILES[profile]['journal_mode']
+    mode = conn.execute(f'PRAGMA journal_mode = {wanted}').fetchone()[0]
+    if mode.upper() != wanted:
+        logger.warning(f"Не вдалося перемкнути журнал SQLite у режим {wanted}, поточний режим: {mode}")
+    return mode
+
+
+class Storage:
+    """Асинхронне сховище бота поверх довгоживучих з'єднань SQLite.
+
+    Усі запити виконуються поза циклом подій: записи йдуть через один
+    виділений потік БД (тож вони серіалізовані), читання — через невеликий
+    пул потоків. Кожен потік тримає власне з'єднання протягом усього життя
+    бота, тому жоден обробник більше не відкриває `sqlite3.connect` сам.
+    Виконані SQL-інструкції рахуються для кожного з'єднання окремо
+    (властивість `statements`), а також у лічильник `current_statements`
+    контексту, з якого прийшов запит. Якщо передано `profiler`
+    (sqltrace.QueryProfiler), через нього проходить кожна операція.
+
+    Кожне з'єднання налаштовується профілем з STORAGE_PROFILES. У режимі WAL
+    фоновий таск періодично переносить журнал у базу і обрізає файл WAL,
+    коли він розростається понад `checkpoint_truncate_pages` сторінок.
+    """
+
+    def __init__(self, path: str = DB_PATH, readers: int = 2, profile: str = DEFAULT_PROFILE,
+                 checkpoint_interval: float = 300, checkpoint_truncate_pages: int = 4096, profiler=None):
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"Невідомий профіль сховища: {profile}")
+        self.path = path
+        self.profile = profile
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_truncate_pages = checkpoint_truncate_pages
+        self.profiler = profiler
+        self._local = threading.local()
+        self._connections = []
+        # Лічильники виконаних інструкцій; кожен змінює лише потік свого з'єднання
+        self._statement_counts = []
+        self._connections_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader')
+        self._checkpoint_task = None
+
+    @property
+    def wal(self) -> bool:
+        return STORAGE_PROFILES[self.profile]['journal_mode'] == 'WAL'
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            apply_connection_pragmas(conn, self.profile)
+            count = [0]
+
+            def trace(statement):
+                count[0] += 1
+                sink = current_statements.get()
+                if sink is not None:
+                    sink[0] += 1
+                if self.profiler is not None:
+                    self.profiler.on_statement(statement)
+
+            conn.set_trace_callback(trace)
+            self._local.conn = conn
+            self._local.trace = trace
+            with self._connections_lock:
+                self._connections.append(conn)
+                self._statement_counts.append(count)
+        return conn
+
+    @property
+    def statements(self) -> int:
+        """Кількість SQL-інструкцій, виконаних усіма з'єднаннями від старту"""
+        with self._connections_lock:
+            return sum(count[0] for count in self._statement_counts)
+
+    def _call(self, fn, args):
+        if self.profiler is not None:
+            conn = self._connection()
+            return self.profiler.profile(conn, fn, args, self._local.trace)
+        return fn(self._connection(), *args)
+
+    async def _read(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        # Контекст копіюється в потік БД, як в asyncio.to_thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._readers, context.run, self._call, fn, args)
+
+    async def _write(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._writer, context.run, self._call, fn, args)
+
+    def close(self) -> None:
+        """Зупиняє потоки БД і закриває всі з'єднання"""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    # --- Схема ---
+
+    async def setup(self) -> None:
+        """Вмикає режим журналу профілю, оновлює схему до останньої версії
+        і запускає періодичні контрольні точки WAL"""
+        mode = await self._write(apply_journal_mode, self.profile)
+        logger.info(f"Профіль сховища: {self.profile} (журнал {mode})")
+        await self._write(migrate)
+        if self.wal and self.checkpoint_interval:
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+
+    async def stop(self) -> None:
+        """Зупиняє контрольні точки і переносить залишок WAL у базу перед закриттям"""
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+        if self.wal:
+            try:
+                await self.checkpoint('TRUNCATE')
+            except sqlite3.Error as e:
+                logger.error(f"Помилка контрольної точки WAL під час зупинки: {e}")
+
+    # --- Обслуговування WAL ---
+
+    @staticmethod
+    def _checkpoint(conn, mode):
+        if mode not in CHECKPOINT_MODES:
+            raise ValueError(f"Недопустимий режим контрольної точки: {mode}")
+        return conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+
+    async def checkpoint(self, mode: str = 'PASSIVE') -> tuple:
+        """Контрольна точка WAL; повертає (busy, сторінок у WAL, перенесено сторінок)"""
+        return await self._write(self._checkpoint, mode)
+
+    async def _checkpoint_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                busy, log_pages, checkpointed = await self.checkpoint('PASSIVE')
+                if busy or checkpointed < log_pages:
+                    logger.info(f"Контрольна точка WAL неповна: перенесено {checkpointed} з {log_pages} сторінок")
+                elif log_pages >= self.checkpoint_truncate_pages:
+                    # PASSIVE не зменшує файл WAL — обрізаємо його, коли всі сторінки вже в базі
+                    await self.checkpoint('TRUNCATE')
+                    logger.info(f"Файл WAL обрізано після контрольної точки ({log_pages} сторінок)")
+            except Exception as e:
+                logger.error(f"Помилка контрольної точки WAL: {e}")
+
+    # --- Налаштування користувача ---
+
+    @staticmethod
+    def _get_user_settings(conn, user_id):
+        return conn.execute('''
+            SELECT (SELECT language FROM user_languages WHERE user_id = :user_id),
+                   (SELECT timezone FROM user_timezones WHERE user_id = :user_id),
+                   (SELECT rate FROM hourly_rates WHERE user_id = :user_id)
+        ''', {'user_id': user_id}).fetchone()
+
+    async def get_user_settings(self, user_id: int) -> tuple:
+        """Повертає (мова, часовий пояс, ставка) одним запитом; відсутні значення — None"""
+        return await self._read(self._get_user_settings, user_id)
+
+    @staticmethod
+    def _set_language(conn, user_id, language):
+        with conn:
+            conn.execute('''INSERT OR REPLACE INTO user_languages (user_id, language)
+                            VALUES (?, ?)''', (user_id, language))
+
+    async def set_language(self, user_id: int, language: str) -> None:
+        await self._write(self._set_language, user_id, language)
+
+    @staticmethod
+    def _get_timezone(conn, user_id):
+        row = conn.execute('SELECT timezone FROM user_timezones WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0] if row else None
+
+    async def get_timezone(self, user_id: int):
+        return await self._read(self._get_timezone, user_id)
+
+    @staticmethod
+    def _get_all_timezones(conn):
+        return dict(conn.execute('SELECT user_id, timezone FROM user_timezones').fetchall())
+
+    async def get_all_timezones(self) -> dict:
+        return await self._read(self._get_all_timezones)
+
+    @staticmethod
+    def _set_timezone(conn, user_id, timezone):
+        with conn:
+            conn.execute('''INSERT OR REPLACE INTO user_timezones (user_id, timezone)
+                            VALUES (?, ?)''', (user_id, timezone))
+
+    async def set_timezone(self, user_id: int, timezone: str) -> None:
+        await self._write(self._set_timezone, user_id, timezone)
+
+    @staticmethod
+    def _set_rate(conn, user_id, rate):
+        with conn:
+            conn.execute('''INSERT OR REPLACE INTO hourly_rates (user_id, rate)
+                            VALUES (?, ?)''', (user_id, rate))
+
+    async def set_rate(self, user_id: int, rate: float) -> None:
+        await self._write(self._set_rate, user_id, rate)
+
+    # --- Записи часу ---
+
+    @staticmethod
+    def _get_shifts(conn, user_id, date):
+        rows = conn.execute('''SELECT id, date, start_at, end_at, timezone FROM time_records
+                               WHERE user_id = ? AND date = ?
+                               ORDER BY start_at''', (user_id, date)).fetchall()
+        return [ShiftRecord(*row) for row in rows]
+
+    async def get_shifts(self, user_id: int, date: str) -> list:
+        """Зміни робочого дня date (ShiftRecord) у порядку початку"""
+        return await self._read(self._get_shifts, user_id, date)
+
+    @staticmethod
+    def _get_open_shift(conn, user_id, since):
+        row = conn.execute('''SELECT id, date, start_at, end_at, timezone FROM time_records
+                              WHERE user_id = ? AND end_at IS NULL AND start_at >= ?
+                              ORDER BY start_at DESC
+                              LIMIT 1''', (user_id, since)).fetchone()
+        return ShiftRecord(*row) if row else None
+
+    async def get_open_shift(self, user_id: int, since: int):
+        """Найпізніша незакрита зміна, що почалася не раніше since, або None"""
+        return await self._read(self._get_open_shift, user_id, since)
+
+    @staticmethod
+    def _get_records_for_dates(conn, user_id, dates):
+        placeholders = ', '.join('?' for _ in dates)
+        rows = conn.execute(f'''SELECT id, date, start_at, end_at, timezone FROM time_records
+                                WHERE date IN ({placeholders}) AND user_id = ?
+                                ORDER BY date, start_at''',
+                            (*dates, user_id)).fetchall()
+        return [ShiftRecord(*row) for row in rows]
+
+    async def get_records_for_dates(self, user_id: int, dates: list) -> list:
+        return await self._read(self._get_records_for_dates, user_id, list(dates))
+
+    @staticmethod
+    def _get_month_day_totals(conn, user_id, month):
+        return conn.execute(f'''SELECT date, SUM({WORKED_SECONDS}) FROM time_records
+                               WHERE user_id = ? AND date >= ? AND date < ?
+                               GROUP BY date
+                               ORDER BY date''', (user_id, *month_bounds(month))).fetchall()
+
+    async def get_month_day_totals(self, user_id: int, month: str) -> list:
+        """(дата, відпрацьовані секунди) для кожного дня з записами за місяць РРРР-ММ"""
+        return await self._read(self._get_month_day_totals, user_id, month)
+
+    @staticmethod
+    def _get_shift_page(conn, user_id, key, older, limit):
+        rows = _keyset_page(conn, '''SELECT id, date, start_at, end_at, timezone FROM time_records
+                                     WHERE user_id = ?''', (user_id,), ('date', 'start_at', 'id'), key, older, limit)
+        return [ShiftRecord(*row) for row in rows]
+
+    async def get_shift_page(self, user_id: int, key, older: bool, limit: int) -> list:
+        """До limit змін, старших (older) або новіших за ключ (date, start_at, id), від найновішої.
+
+        Змін з однаковими датою й початком може бути кілька; id (rowid, яким закінчується
+        індекс) робить ключ унікальним, тож сторінка не пропускає решту такої групи.
+        """
+        return await self._read(self._get_shift_page, user_id, key, older, limit)
+
+    @staticmethod
+    def _get_date_page(conn, user_id, month, key, older, limit):
+        rows = _keyset_page(conn, '''SELECT DISTINCT date FROM time_records
+                                     WHERE user_id = ? AND date >= ? AND date < ?''',
+                            (user_id, *month_bounds(month)), ('date',), key, older, limit)
+        return [row[0] for row in rows]
+
+    async def get_date_page(self, user_id: int, month: str, key, older: bool, limit: int) -> list:
+        """До limit дат місяця з записами, старших (older) або новіших за ключ (date,), від найновішої"""
+        return await self._read(self._get_date_page, user_id, month, key, older, limit)
+
+    @staticmethod
+    def _get_month_page(conn, user_id, key, older, limit):
+        rows = _keyset_page(conn, 'SELECT month FROM monthly_totals WHERE user_id = ?', (user_id,),
+                            ('month',), key, older, limit)
+        return [row[0] for row in rows]
+
+    async def get_month_page(self, user_id: int, key, older: bool, limit: int) -> list:
+        """До limit місяців з записами, старших (older) або новіших за ключ (month,), від найновішого"""
+        return await self._read(self._get_month_page, user_id, key, older, limit)
+
+    @staticmethod
+    def _get_shift(conn, user_id, shift_id):
+        row = conn.execute('''SELECT id, date, start_at, end_at, timezone FROM time_records
+                              WHERE id = ? AND user_id = ?''', (shift_id, user_id)).fetchone()
+        return ShiftRecord(*row) if row else None
+
+    async def get_shift(self, user_id: int, shift_id: int):
+        """Зміна користувача за id або None"""
+        return await self._read(self._get_shift, user_id, shift_id)
+
+    @staticmethod
+    def _get_month_summary(conn, user_id, month):
+        return conn.execute('''SELECT record_count, total_seconds FROM monthly_totals
+                               WHERE user_id = ? AND month = ?''', (user_id, month)).fetchone()
+
+    async def get_month_summary(self, user_id: int, month: str):
+        """(кількість записів, відпрацьовані секунди) за місяць зі зведеної таблиці або None"""
+        return await self._read(self._get_month_summary, user_id, month)
+
+    @staticmethod
+    def _insert_arrival(conn, user_id, date, start_at, timezone):
+        with conn:
+            cursor = conn.execute('''INSERT INTO time_records (date, user_id, start_at, timezone)
+                                     VALUES (?, ?, ?, ?)''', (date, user_id, start_at, timezone))
+            _apply_month_delta(conn, user_id, date, 1, 0)
+        return cursor.lastrowid
+
+    async def insert_arrival(self, user_id: int, date: str, start_at: int, timezone: str) -> int:
+        """Відкриває нову зміну робочого дня date, що почалася в start_at (секунди епохи UTC);
+        повертає ідентифікатор зміни"""
+        return await self._write(self._insert_arrival, user_id, date, start_at, timezone)
+
+    @staticmethod
+    def _set_times(conn, user_id, shift_id, times):
+        """Встановлює межі зміни і зміщує місячний підсумок на різницю тривалостей"""
+        with conn:
+            row = conn.execute('''SELECT id, date, start_at, end_at, timezone FROM time_records
+                                  WHERE id = ? AND user_id = ?''', (shift_id, user_id)).fetchone()
+            if row is None:
+                return 0
+            record = ShiftRecord(*row)
+            updated = record._replace(**times(record))
+            cursor = conn.execute('UPDATE time_records SET start_at = ?, end_at = ? WHERE id = ?',
+                                  (updated.start_at, updated.end_at, shift_id))
+            _apply_month_delta(conn, user_id, record.date, 0,
+                               (updated.worked_seconds or 0) - (record.worked_seconds or 0))
+        return cursor.rowcount
+
+    async def set_departure(self, user_id: int, shift_id: int, end_at: int) -> int:
+        """Закриває зміну в момент end_at (секунди епохи UTC)"""
+        return await self._write(self._set_times, user_id, shift_id, lambda record: {'end_at': end_at})
+
+    @staticmethod
+    def _edited_times(field, value):
+        """Нові межі зміни після ручного введення часу ГГ:ХХ:СС у поясі запису"""
+        if field not in EDITABLE_TIME_FIELDS:
+            raise ValueError(f"Недопустиме поле запису: {field}")
+
+        def times(record):
+            if field == 'arrival_time':
+                start_at = local_epoch(record.date, value, record.timezone)
+                # Відхід лишається тим самим місцевим часом відносно нового приходу
+                departure = local_clock(record.end_at, record.timezone)
+            else:
+                start_at, departure = record.start_at, value
+            end_at = departure_epoch(record.date, departure, record.timezone, start_at) if departure else None
+            return {'start_at': start_at, 'end_at': end_at}
+
+        return times
+
+    async def update_time(self, user_id: int, shift_id: int, field: str, value: str) -> int:
+        """Оновлює місцевий час приходу або відходу зміни; повертає кількість змінених рядків"""
+        return await self._write(self._set_times, user_id, shift_id, self._edited_times(field, value))
+
+    @staticmethod
+    def _delete_record(conn, user_id, shift_id):
+        with conn:
+            row = conn.execute(f'''SELECT date, {WORKED_SECONDS} FROM time_records
+                                   WHERE id = ? AND user_id = ?''', (shift_id, user_id)).fetchone()
+            if row is None:
+                return 0
+            cursor = conn.execute('DELETE FROM time_records WHERE id = ?', (shift_id,))
+            _apply_month_delta(conn, user_id, row[0], -cursor.rowcount, -(row[1] or 0) * cursor.rowcount)
+        return cursor.rowcount
+
+    async def delete_record(self, user_id: int, shift_id: int) -> int:
+        """Видаляє зміну; повертає кількість видалених рядків"""
+        return await self._write(self._delete_record, user_id, shift_id)
+
+    @staticmethod
+    def _sweep_open_shifts(conn, started_after, started_before, close_after, now, limit):
+        with conn:
+            rows = conn.execute('''SELECT id, user_id, date, start_at, timezone FROM time_records
+                                   WHERE end_at IS NULL AND swept_at IS NULL AND start_at >= ? AND start_at < ?
+                                   ORDER BY start_at
+                                   LIMIT ?''', (started_after, started_before, limit)).fetchall()
+            swept = []
+            for shift_id, user_id, date, start_at, timezone in rows:
+                end_at = min(start_at + close_after, now) if close_after is not None else None
+                conn.execute('UPDATE time_records SET end_at = ?, swept_at = ? WHERE id = ?',
+                             (end_at, now, shift_id))
+                if end_at is not None:
+                    _apply_month_delta(conn, user_id, date, 0, end_at - start_at)
+                swept.append((user_id, ShiftRecord(shift_id, date, start_at, end_at, timezone)))
+        return swept
+
+    async def sweep_open_shifts(self, started_after: int, started_before: int, close_after, now: int,
+                                limit: int) -> list:
+        """Позначає до limit незакритих змін, що почалися в [started_after, started_before), і з
+        close_after (с) закриває їх; повертає [(user_id, ShiftRecord)]"""
+        return await self._write(self._sweep_open_shifts, started_after, started_before, close_after, now, limit)
+
+    @staticmethod
+    def _mark_abandoned_shifts(conn, started_before, now):
+        with conn:
+            cursor = conn.execute('''UPDATE time_records SET swept_at = ?
+                                     WHERE end_at IS NULL AND swept_at IS NULL AND start_at < ?''',
+                                  (now, started_before))
+        return cursor.rowcount
+
+    async def mark_abandoned_shifts(self, started_before: int, now: int) -> int:
+        """Позначає swept_at незакриті зміни, що почалися до started_before, не закриваючи їх;
+        повертає їх кількість"""
+        return await self._write(self._mark_abandoned_shifts, started_before, now)
+
+    # --- Нагадування про кінець зміни ---
+
+    @staticmethod
+    def _save_reminder(conn, user_id, remind_at, shift_end):
+        with conn:
+            conn.execute('''INSERT OR REPLACE INTO shift_reminders (user_id, remind_at, shift_end)
+                            VALUES (?, ?, ?)''', (user_id, remind_at, shift_end))
+
+    async def save_reminder(self, user_id: int, remind_at: int, shift_end: int) -> None:
+        await self._write(self._save_reminder, user_id, remind_at, shift_end)
+
+    @staticmethod
+    def _delete_reminders(conn, user_ids):
+        with conn:
+            conn.executemany('DELETE FROM shift_reminders WHERE user_id = ?',
+                             ((user_id,) for user_id in user_ids))
+
+    async def delete_reminders(self, user_ids: list) -> None:
+        await self._write(self._delete_reminders, list(user_ids))
+
+    @staticmethod
+    def _delete_due_reminders(conn, now):
+        with conn:
+            conn.execute('DELETE FROM shift_reminders WHERE remind_at <= ?', (now,))
+
+    async def delete_due_reminders(self, now: int) -> None:
+        """Видаляє всі нагадування з часом спрацювання не пізніше now"""
+        await self._write(self._delete_due_reminders, now)
+
+    @staticmethod
+    def _get_pending_reminders(conn):
+        return conn.execute('SELECT user_id, remind_at, shift_end FROM shift_reminders').fetchall()
+
+    async def get_pending_reminders(self) -> list:
+        """(user_id, remind_at, shift_end) для всіх збережених нагадувань"""
+        return await self._read(self._get_pending_reminders)
+
+    # --- Профілі користувачів Telegram ---
+
+    @staticmethod
+    def _get_profile(conn, user_id):
+        return conn.execute('''SELECT user_id, username, first_name, last_name, is_bot, language_code, fetched_at
+                               FROM user_profiles WHERE user_id = ?''', (user_id,)).fetchone()
+
+    async def get_profile(self, user_id: int):
+        """(id, username, first_name, last_name, is_bot, language_code, fetched_at) або None"""
+        return await self._read(self._get_profile, user_id)
+
+    @staticmethod
+    def _get_profiles(conn, user_ids):
+        rows = []
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            rows.extend(conn.execute(f'''SELECT user_id, username, first_name, last_name, is_bot,
+                                                language_code, fetched_at
+                                         FROM user_profiles WHERE user_id IN ({placeholders})''',
+                                     chunk).fetchall())
+        return rows
+
+    async def get_profiles(self, user_ids: list) -> list:
+        return await self._read(self._get_profiles, list(user_ids))
+
+    @staticmethod
+    def _save_profile(conn, profile, fetched_at):
+        with conn:
+            conn.execute('''INSERT OR REPLACE INTO user_profiles
+                            (user_id, username, first_name, last_name, is_bot, language_code, fetched_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         (profile['id'], profile['username'], profile['first_name'], profile['last_name'],
+                          profile['is_bot'], profile['language_code'], fetched_at))
+
+    async def save_profile(self, profile: dict, fetched_at: int) -> None:
+        await self._write(self._save_profile, profile, fetched_at)
+
+    @staticmethod
+    def _touch_profile(conn, user_id, fetched_at):
+        with conn:
+            conn.execute('UPDATE user_profiles SET fetched_at = ? WHERE user_id = ?', (fetched_at, user_id))
+
+    async def touch_profile(self, user_id: int, fetched_at: int) -> None:
+        await self._write(self._touch_profile, user_id, fetched_at)
+
+    @staticmethod
+    def _get_stale_profiles(conn, before, limit):
+        rows = conn.execute('''SELECT user_id FROM user_profiles
+                               WHERE fetched_at < ?
+                               ORDER BY fetched_at
+                               LIMIT ?''', (before, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    async def get_stale_profiles(self, before: int, limit: int) -> list:
+        """Найдавніше оновлені профілі, отримані раніше before"""
+        return await self._read(self._get_stale_profiles, before, limit)
+
+    # --- Сесії: user_data і стани розмов ---
+
+    @staticmethod
+    def _get_session(conn, user_id):
+        row = conn.execute('SELECT data FROM user_data WHERE user_id = ?', (user_id,)).fetchone()
+        conversations = conn.execute('SELECT name, key, state FROM conversations WHERE user_id = ?',
+                                     (user_id,)).fetchall()
+        return (row[0] if row else None), conversations
+
+    async def get_session(self, user_id: int) -> tuple:
+        """(user_data у JSON або None, [(назва розмови, ключ у JSON, стан)]) користувача"""
+        return await self._read(self._get_session, user_id)
+
+    @staticmethod
+    def _save_sessions(conn, user_data, conversations):
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)',
+                             ((user_id, data) for user_id, data in user_data if data is not None))
+            conn.executemany('DELETE FROM user_data WHERE user_id = ?',
+                             ((user_id,) for user_id, data in user_data if data is None))
+            conn.executemany('''INSERT OR REPLACE INTO conversations (user_id, name, key, state)
+                                VALUES (?, ?, ?, ?)''',
+                             (row for row in conversations if row[3] is not None))
+            conn.executemany('DELETE FROM conversations WHERE user_id = ? AND name = ? AND key = ?',
+                             (row[:3] for row in conversations if row[3] is None))
+
+    async def save_sessions(self, user_data: list, conversations: list) -> None:
+        """Зберігає пачку змін однією транзакцією.
+
+        user_data — [(user_id, JSON або None для видалення)],
+        conversations — [(user_id, назва, ключ у JSON, стан або None для видалення)].
+        """
+        await self._write(self._save_sessions, list(user_data), list(conversations))
+
+    # --- Статистика для адміністратора ---
+
+    @staticmethod
+    def _get_user_stats(conn, user_id):
+        return conn.execute('''
+            SELECT COUNT(*) as records,
+                   MIN(date) as first_record,
+                   MAX(date) as last_record
+            FROM time_records
+            WHERE user_id = ?
+        ''', (user_id,)).fetchone()
+
+    async def get_user_stats(self, user_id: int) -> tuple:
+        """(кількість записів, перший запис, останній запис)"""
+        return await self._read(self._get_user_stats, user_id)
+
+    @staticmethod
+    def _get_all_user_stats(conn):
+        return conn.execute('''
+            SELECT user_id,
+                   COUNT(*) as records,
+                   MIN(date) as first_record,
+                   MAX(date) as last_record
+            FROM time_records
+            GROUP BY user_id
+        ''').fetchall()
+
+    async def get_all_user_stats(self) -> list:
+        return await self._read(self._get_all_user_stats)
+
+    # --- Обслуговування ---
+
+    @staticmethod
+    def _rebuild_monthly_totals(conn):
+        with conn:
+            conn.execute(f'''
+                CREATE TEMP TABLE expected_totals AS
+                SELECT user_id, substr(date, 1, 7) AS month,
+                       COUNT(*) AS record_count, COALESCE(SUM({WORKED_SECONDS}), 0) AS total_seconds
+                FROM time_records
+                GROUP BY user_id, substr(date, 1, 7)
+            ''')
+            mismatches = conn.execute('''
+                SELECT COUNT(*) FROM (
+                    SELECT * FROM (SELECT * FROM expected_totals EXCEPT SELECT * FROM monthly_totals)
+                    UNION ALL
+                    SELECT * FROM (SELECT * FROM monthly_totals EXCEPT SELECT * FROM expected_totals)
+                )
+            ''').fetchone()[0]
+            conn.execute('DROP TABLE expected_totals')
+            if mismatches:
+                conn.execute('DELETE FROM monthly_totals')
+                _fill_monthly_totals(conn)
+        return mismatches
+
+    async def rebuild_monthly_totals(self) -> int:
+        """Звіряє monthly_totals із time_records і перебудовує таблицю за розбіжностей.
+
+        Повертає кількість розбіжних рядків (0 — зведення узгоджене).
+        """
+        return await self._write(self._rebuild_monthly_totals)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Що робити із забутою зміною: закрити через звичайну тривалість зміни або лише позначити
+SWEEP_ACTIONS = ('close', 'flag')
+
+
+class ShiftSweeper:
+    """Фоновий прибиральник забутих змін.
+
+    Раз на `interval` секунд шукає за частковим індексом idx_time_records_stale
+    зміни, відкриті довше за `max_age`, але не довше за `window` секунд, і
+    обробляє їх пачками до `batch_size`: кожна пачка — одна коротка
+    транзакція запису, тож інтерактивні записи встигають між пачками. У
+    режимі 'close' зміна закривається через `close_after` секунд після
+    початку, у режимі 'flag' лише позначається (swept_at) і лишається
+    відкритою. Кожен власник змін пачки отримує одне сповіщення про всі свої
+    зміни; наступна пачка береться після відправлення попередньої.
+
+    Зміни, відкриті довше за `window` (зокрема давні записи, що лишилися
+    до появи прибиральника), не закриваються вигаданою тривалістю: їх лише
+    позначають, без сповіщень і без зміни підсумків.
+    """
+
+    def __init__(self, db, interval: float, max_age: float, batch_size: int,
+                 action: str = 'close', close_after: float = 8 * 3600, window: float = 48 * 3600):
+        if action not in SWEEP_ACTIONS:
+            raise ValueError(f"Невідома дія з забутими змінами: {action}")
+        self._db = db
+        self.interval = interval
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.window = window
+        self.close_after = int(close_after) if action == 'close' else None
+        self.swept = 0
+        self._notify = None
+        self._bot = None
+        self._task = None
+
+    async def start(self, bot, notify) -> None:
+        """Запускає фоновий таск.
+
+        notify(bot, user_id, records) — корутина, що сповіщає користувача про його оброблені зміни пачки.
+        """
+        self._bot = bot
+        self._notify = notify
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def sweep(self) -> int:
+        """Обробляє всі забуті зміни пачками; повертає їх кількість"""
+        now = int(time.time())
+        abandoned = await self._db.mark_abandoned_shifts(now - int(self.window), now)
+        if abandoned:
+            logger.info(f"Позначено давніх незакритих змін без сповіщення: {abandoned}")
+        total = 0
+        while True:
+            now = int(time.time())
+            batch = await self._db.sweep_open_shifts(now - int(self.window), now - int(self.max_age),
+                                                     self.close_after, now, self.batch_size)
+            if not batch:
+                break
+            total += len(batch)
+            self.swept += len(batch)
+            by_user = {}
+            for user_id, record in batch:
+                by_user.setdefault(user_id, []).append(record)
+            results = await asyncio.gather(*(self._notify(self._bot, user_id, records)
+                                             for user_id, records in by_user.items()),
+                                           return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Помилка сповіщення про забуту зміну: {result}")
+            if len(batch) < self.batch_size:
+                break
+        if total:
+            logger.info(f"Оброблено забутих змін: {total}")
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Помилка прибирання забутих змін: {e}")
+            await asyncio.sleep(self.interval)
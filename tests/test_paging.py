@@ -0,0 +1,39 @@
+import asyncio
+
+import config
+import main
+from paging import load_page
+from storage import Storage
+
+START_AT = 1743318000  # 2025-03-30 09:00 за Києвом
+
+
+def test_shift_pages_reach_every_tied_shift(tmp_path, monkeypatch):
+    """Сторінки списку змін доходять до всіх змін з однаковими датою й початком"""
+    db = Storage(str(tmp_path / 'timekeeper.db'))
+    monkeypatch.setattr(main, 'db', db)
+    size = config.LIST_PAGE_SIZE
+
+    async def pages():
+        await db.setup()
+        ids = [await db.insert_arrival(1, '2025-03-30', START_AT, 'Europe/Kyiv') for _ in range(size * 2 + 2)]
+        seen = []
+        cursor = None
+        # Межа кількості сторінок: якщо курсор втрачає рядки, список повертається на початок
+        for _ in range(len(ids)):
+            fetch, key, button = main.list_source(1, main.EDIT_LIST, cursor)
+            page = await load_page(fetch, key, True, size)
+            seen.extend(shift.id for shift in page.rows)
+            if not page.has_older:
+                break
+            cursor = button(page.rows[-1])[2]
+        back = await load_page(*main.list_source(1, main.EDIT_LIST, button(page.rows[0])[2])[:2], False, size)
+        await db.stop()
+        return ids, seen, [shift.id for shift in back.rows]
+
+    try:
+        ids, seen, back = asyncio.run(pages())
+    finally:
+        db.close()
+    assert seen == ids[::-1]
+    assert back == ids[::-1][size:size * 2]
@@ -0,0 +1,95 @@
+import functools
+from bisect import bisect_right
+from datetime import date as Date, datetime
+
+import pytz
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_DAY = 86400
+# На стільки pytz зсуває неіснуючий місцевий час, щоб вийти з переходу на літній час
+_GAP_SHIFT = 6 * 3600
+
+
+@functools.lru_cache(maxsize=None)
+def get_zone(name: str):
+    """Об'єкт часового поясу pytz; кожна назва розбирається лише раз"""
+    return pytz.timezone(name)
+
+
+@functools.lru_cache(maxsize=None)
+def zone_offsets(name: str) -> 'ZoneOffsets':
+    """Таблиця зміщень часового поясу, побудована один раз на назву"""
+    return ZoneOffsets(get_zone(name))
+
+
+class ZoneOffsets:
+    """Таблиця переходів часового поясу в секундах епохи UTC.
+
+    Будується з тих самих даних tzfile, що й pytz, тож результати збігаються
+    з fromtimestamp()/localize(is_dst=False) до секунди, але без створення
+    datetime на кожен запис. Зміщення для моменту — пошук у відсортованому
+    списку переходів; останній знайдений проміжок між переходами
+    запам'ятовується, тож записи однієї пачки (зазвичай одного сезону)
+    отримують зміщення без пошуку.
+    """
+
+    def __init__(self, zone):
+        transitions = getattr(zone, '_utc_transition_times', None)
+        if transitions:
+            self._starts = [int((moment - _EPOCH).total_seconds()) for moment in transitions]
+            self._info = [(int(offset.total_seconds()), bool(dst)) for offset, dst, _ in zone._transition_info]
+        else:
+            # Пояс без переходів (UTC, Etc/GMT+N)
+            self._starts = [int((datetime.min - _EPOCH).total_seconds())]
+            self._info = [(int(zone.utcoffset(None).total_seconds()), False)]
+        self._window = (self._starts[0], self._window_end(0), *self._info[0])
+
+    def _window_end(self, index):
+        return self._starts[index + 1] if index + 1 < len(self._starts) else float('inf')
+
+    def _lookup(self, epoch: int) -> tuple:
+        """(зміщення, чи літній час) у момент epoch"""
+        start, end, offset, dst = self._window
+        if start <= epoch < end:
+            return offset, dst
+        index = max(0, bisect_right(self._starts, epoch) - 1)
+        offset, dst = self._info[index]
+        self._window = (self._starts[index], self._window_end(index), offset, dst)
+        return offset, dst
+
+    def clock(self, epoch: int) -> str:
+        """Місцевий час ГГ:ХХ:СС у момент epoch"""
+        seconds = (epoch + self._lookup(epoch)[0]) % _DAY
+        return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+    def to_epoch(self, date: str, time: str) -> int:
+        """Секунди епохи UTC для місцевого часу ГГ:ХХ:СС дати РРРР-ММ-ДД.
+
+        Як і localize(is_dst=False): неіснуючий час (перехід на літній) береться
+        за зміщенням до переходу, неоднозначний (перехід на зимовий) — за
+        зимовим часом.
+        """
+        hours, minutes, seconds = (int(part) for part in time.split(':'))
+        if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+            raise ValueError(f"Недопустимий час: {time}")
+        wall = (Date.fromisoformat(date).toordinal() - _EPOCH_ORDINAL) * _DAY + hours * 3600 + minutes * 60 + seconds
+        return self._wall_to_epoch(wall)
+
+    def _wall_to_epoch(self, wall: int) -> int:
+        candidates = {}
+        # Зміщення за добу до і після місцевого часу покривають будь-який перехід між ними
+        for probe in (wall - _DAY, wall + _DAY):
+            index = max(0, bisect_right(self._starts, probe) - 1)
+            epoch = wall - self._info[index][0]
+            offset, dst = self._lookup(epoch)
+            if epoch + offset == wall:
+                candidates[epoch] = dst
+        if len(candidates) == 1:
+            return next(iter(candidates))
+        if not candidates:
+            return self._wall_to_epoch(wall - _GAP_SHIFT) + _GAP_SHIFT
+        standard = [epoch for epoch, dst in candidates.items() if not dst]
+        if len(standard) == 1:
+            return standard[0]
+        return max(standard or candidates)